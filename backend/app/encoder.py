@@ -0,0 +1,64 @@
+"""Face decoding and batch encoding.
+
+This is the entry point of the bulk encoder worker processes: the spawn start method
+imports it in every worker, so it must stay free of import-time side effects.
+"""
+import logging
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import dlib
+import face_recognition
+import face_recognition.api
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def decode_image(image_data: Union[bytes, Path]) -> Tuple[np.ndarray, Image.Image]:
+    """Decode image bytes, or an image file, once into an RGB pixel array and its PIL image.
+    
+    Unlike face_recognition.load_image_file this skips the convert('RGB') copy
+    when the image already is RGB, which is the case for every JPEG.
+    """
+    pil_image = Image.open(image_data if isinstance(image_data, Path) else BytesIO(image_data))
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+    # np.array rather than np.asarray: dlib needs a writeable buffer
+    return np.array(pil_image), pil_image
+
+
+def encode_faces_batch(images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+    """
+    Encode the first face of each image with a single batched ResNet forward pass.
+    Faces are detected and aligned per image, then all 150x150 face chips go through
+    dlib's encoder together. Returns one encoding per image, None where no face was found.
+    """
+    chips = []
+    chip_images = []
+    for i, image in enumerate(images):
+        face_locations = face_recognition.face_locations(image, model="cnn")
+        if not face_locations:
+            logger.warning(f"No face detected in image {i} of batch")
+            continue
+        
+        top, right, bottom, left = face_locations[0]
+        # Same 5-point alignment, size and padding face_recognition.face_encodings uses
+        landmarks = face_recognition.api.pose_predictor_5_point(image, dlib.rectangle(left, top, right, bottom))
+        chips.append(dlib.get_face_chip(image, landmarks, size=150, padding=0.25))
+        chip_images.append(i)
+    
+    encodings: List[Optional[np.ndarray]] = [None] * len(images)
+    if chips:
+        descriptors = face_recognition.api.face_encoder.compute_face_descriptor(chips, num_jitters=1)
+        for i, descriptor in zip(chip_images, descriptors):
+            encodings[i] = np.asarray(descriptor, dtype=np.float32)
+    
+    return encodings
+
+
+def encode_images(images_data: List[bytes]) -> List[Optional[np.ndarray]]:
+    """Decode and encode the first face of each image; runs in encoder worker processes."""
+    return encode_faces_batch([decode_image(image_data)[0] for image_data in images_data])
@@ -1,29 +1,173 @@
+import math
+import threading
 import numpy as np
 import face_recognition
 import logging
-from typing import Optional, Tuple, List, Dict
+from collections import OrderedDict
+from functools import partial
+from typing import Optional, Tuple, List, Dict, NamedTuple
 from io import BytesIO
+from PIL import Image
+from .encoder import decode_image
 from .storage import FaceStorage
+from . import recognition_kernels
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
 
 logger = logging.getLogger(__name__)
 
 
+class KnownEncodings(NamedTuple):
+    """Snapshot of all known encodings, flattened for vectorized comparison."""
+    matrix: np.ndarray  # (N, 128) float32, each person's rows contiguous
+    squared_norms: np.ndarray  # (N,) row norms squared
+    group_offsets: np.ndarray  # (people + 1,) start row of each person, plus N
+    group_names: List[str]
+    group_index: Dict[str, int]  # name -> position in group_names
+    row_groups: np.ndarray  # (N,) person position for each row
+    ann_index: Optional[object]  # faiss index over matrix, or None
+
+
 class FaceRecognitionService:
-    def __init__(self, storage: FaceStorage, tolerance: float = 0.75):
+    DETECTOR_MODELS = ("hog", "cnn")
+    # Longest image side used for face detection; detector cost scales with pixel count
+    DETECTION_MAX_DIMENSION = 800
+    # A match this close is accepted without comparing against everyone else
+    EARLY_EXIT_DISTANCE = 0.35
+    # Number of recently recognized people checked before the full comparison
+    RECENT_NAMES_SIZE = 8
+    # Below this many encodings brute force beats a faiss index; above the HNSW
+    # size an approximate graph index is used instead of an exact flat one
+    FAISS_MIN_ENCODINGS = 256
+    FAISS_HNSW_MIN_ENCODINGS = 1000
+    
+    def __init__(self, storage: FaceStorage, tolerance: float = 0.75, detector_model: str = "hog", min_face_size: int = 40):
         self.storage = storage
         self.tolerance = tolerance
-        self._known_encodings_cache = None
+        self._tolerance_sq = tolerance ** 2
+        self._early_exit_sq = min(self.EARLY_EXIT_DISTANCE, tolerance) ** 2
+        self.detector_model = detector_model
+        self.min_face_size = min_face_size
+        self._known = self._build_known_encodings(
+            np.empty((0, 128), dtype=np.float32), np.zeros((1,), dtype=np.intp), []
+        )
+        # {name: (mtime_ns, (N, 128) encodings)}, None until first loaded
+        self._encoding_files: Optional[Dict[str, Tuple[int, np.ndarray]]] = None
         self._cache_dirty = True
+        # Recognition runs in worker threads; serializes rebuilds of the cached matrix
+        self._cache_lock = threading.Lock()
+        # Most recently recognized names first, checked before everyone else
+        self._recent_names: "OrderedDict[str, None]" = OrderedDict()
+        self._recent_lock = threading.Lock()
+    
+    def _build_known_encodings(self, matrix: np.ndarray, group_offsets: np.ndarray, group_names: List[str]) -> KnownEncodings:
+        """Derive the comparison artifacts from a flattened encodings matrix."""
+        # float32 on both sides keeps the distance matmul in SGEMM
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        group_offsets = np.asarray(group_offsets, dtype=np.intp)
+        group_names = list(group_names)
+        
+        ann_index = None
+        if faiss is not None and len(matrix) >= self.FAISS_MIN_ENCODINGS:
+            if len(matrix) >= self.FAISS_HNSW_MIN_ENCODINGS:
+                ann_index = faiss.IndexHNSWFlat(matrix.shape[1], 32)
+            else:
+                ann_index = faiss.IndexFlatL2(matrix.shape[1])
+            ann_index.add(matrix)
+        
+        return KnownEncodings(
+            matrix=matrix,
+            squared_norms=(matrix ** 2).sum(axis=1),
+            group_offsets=group_offsets,
+            group_names=group_names,
+            group_index={name: i for i, name in enumerate(group_names)},
+            row_groups=np.repeat(np.arange(len(group_names), dtype=np.intp), np.diff(group_offsets)),
+            ann_index=ann_index
+        )
+    
+    def _sync_encoding_files(self) -> bool:
+        """
+        Bring the per-person encoding cache in line with the known faces directory,
+        loading only people whose encodings file is new or modified and dropping
+        removed ones. Returns True if anything changed.
+        """
+        mtimes = self.storage.scan_known_encodings()
+        changed = False
+        
+        for name in list(self._encoding_files):
+            if name not in mtimes:
+                del self._encoding_files[name]
+                changed = True
+        
+        for name, mtime_ns in mtimes.items():
+            entry = self._encoding_files.get(name)
+            if entry is not None and entry[0] == mtime_ns:
+                continue
+            try:
+                encodings = self.storage.load_person_encodings(name)
+            except Exception as e:
+                logger.warning(f"Could not load encodings: name={name}, error={str(e)}")
+                continue
+            
+            if len(encodings):
+                self._encoding_files[name] = (mtime_ns, encodings)
+            else:
+                self._encoding_files.pop(name, None)
+            changed = True
+        
+        return changed
     
-    def _load_encodings(self):
-        """Load encodings from storage, using cache if available."""
-        if self._known_encodings_cache is None or self._cache_dirty:
-            self._known_encodings_cache = self.storage.load_known_encodings()
+    def _load_encodings(self) -> KnownEncodings:
+        """Load encodings from storage, using cache if available.
+        
+        Known encodings are kept as a flattened (N, 128) float32 matrix with the squared
+        row norms, plus the offsets of each person's rows within it, so distances can be
+        computed for every probe face with a single matmul and reduced to a per-person
+        minimum in one pass. The matrix is rebuilt from an in-memory {name: (mtime,
+        encodings)} cache, which is seeded from storage's persisted copy on first load
+        and on invalidation only loads the people whose encodings file changed.
+        Returns a consistent snapshot that stays valid while the cache is rebuilt.
+        """
+        with self._cache_lock:
+            if not self._cache_dirty:
+                return self._known
+            
+            # Cleared before reading storage so an invalidation during the rebuild is kept
             self._cache_dirty = False
-        return self._known_encodings_cache
+            first_load = self._encoding_files is None
+            if first_load:
+                self._encoding_files = self.storage.load_encoding_cache()
+            
+            changed = self._sync_encoding_files()
+            if not changed and not first_load:
+                return self._known
+            
+            rows = []
+            group_names = []
+            group_offsets = [0]
+            for name in sorted(self._encoding_files):
+                person_encodings = self._encoding_files[name][1]
+                rows.append(person_encodings)
+                group_names.append(name)
+                group_offsets.append(group_offsets[-1] + len(person_encodings))
+            
+            if rows:
+                matrix = np.vstack(rows).astype(np.float32, copy=False)
+            else:
+                matrix = np.empty((0, 128), dtype=np.float32)
+            
+            if changed:
+                self.storage.save_encoding_cache(self._encoding_files)
+            logger.info(f"Built known encodings: encodings={len(matrix)}, people={len(group_names)}, changed={changed}")
+            
+            self._known = self._build_known_encodings(matrix, group_offsets, group_names)
+            return self._known
     
     def invalidate_cache(self):
-        """Invalidate the cache when faces are added/removed."""
+        """Invalidate the cache when faces are added/removed; only changed people are reloaded."""
         self._cache_dirty = True
     
     def set_tolerance(self, tolerance: float):
@@ -31,52 +175,182 @@ class FaceRecognitionService:
         if tolerance < 0.0 or tolerance > 1.0:
             raise ValueError("Tolerance must be between 0.0 and 1.0")
         self.tolerance = tolerance
+        self._tolerance_sq = tolerance ** 2
+        self._early_exit_sq = min(self.EARLY_EXIT_DISTANCE, tolerance) ** 2
         logger.info(f"Tolerance updated to {tolerance}")
     
+    def set_detector_model(self, detector_model: str):
+        """Update the face detector model ('hog' or 'cnn') dynamically."""
+        if detector_model not in self.DETECTOR_MODELS:
+            raise ValueError(f"Detector model must be one of {', '.join(self.DETECTOR_MODELS)}")
+        self.detector_model = detector_model
+        logger.info(f"Detector model updated to {detector_model}")
+    
+    def set_min_face_size(self, min_face_size: int):
+        """Update the minimum face size (in pixels) dynamically."""
+        if min_face_size < 0:
+            raise ValueError("Minimum face size must not be negative")
+        self.min_face_size = min_face_size
+        logger.info(f"Minimum face size updated to {min_face_size}")
+    
+    def _detect_faces(self, image: np.ndarray, pil_image: Optional[Image.Image] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        Detect faces on a downscaled copy of the image and return their locations
+        as (top, right, bottom, left) in full-resolution coordinates.
+        Pass the PIL image the array was decoded from to resize it without a conversion.
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, self.DETECTION_MAX_DIMENSION / max(height, width))
+        
+        if scale < 1.0:
+            if pil_image is None:
+                pil_image = Image.fromarray(image)
+            small = np.array(pil_image.resize((int(width * scale), int(height * scale)), Image.BILINEAR))
+        else:
+            small = image
+        
+        # HOG is fast on CPU; fall back to the slower CNN model only when it finds nothing
+        face_locations = face_recognition.face_locations(small, model=self.detector_model)
+        logger.info(f"Detected {len(face_locations)} face(s) in image using {self.detector_model.upper()} model")
+        
+        if not face_locations and self.detector_model == "hog":
+            face_locations = face_recognition.face_locations(small, number_of_times_to_upsample=1, model="cnn")
+            logger.info(f"Detected {len(face_locations)} face(s) in image using CNN fallback")
+        
+        if scale < 1.0:
+            face_locations = [
+                (
+                    max(0, round(top / scale)),
+                    min(width, round(right / scale)),
+                    min(height, round(bottom / scale)),
+                    max(0, round(left / scale))
+                )
+                for top, right, bottom, left in face_locations
+            ]
+        
+        return face_locations
+    
+    def _mark_recent(self, names: List[str]):
+        """Move recognized names to the front of the recently recognized list."""
+        if not names:
+            return
+        with self._recent_lock:
+            for name in names:
+                self._recent_names[name] = None
+                self._recent_names.move_to_end(name, last=False)
+            while len(self._recent_names) > self.RECENT_NAMES_SIZE:
+                self._recent_names.popitem(last=True)
+    
+    def _match_encodings(self, probes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        Find the closest known person for each probe encoding.
+        Returns (best group index per probe, best squared distance per probe, group names).
+        
+        Recently recognized people are compared first, one small matmul each; once every
+        probe has a match within the early exit distance the remaining people are skipped.
+        Otherwise the nearest encoding is looked up in the faiss index when one was built,
+        or found by the fused numba kernel when numba is installed, or all squared
+        distances |a - b|^2 = |a|^2 + |b|^2 - 2 a.b are computed with one matmul and
+        reduced to a per-person minimum.
+        """
+        known = self._load_encodings()
+        if not known.group_names:
+            return np.empty((0,), dtype=np.intp), np.empty((0,), dtype=np.float32), known.group_names
+        
+        probes_sq = (probes ** 2).sum(axis=1)
+        
+        with self._recent_lock:
+            recent_names = list(self._recent_names)
+        
+        best_groups = np.zeros(len(probes), dtype=np.intp)
+        best_d2 = np.full(len(probes), np.inf, dtype=np.float32)
+        for name in recent_names:
+            group = known.group_index.get(name)
+            if group is None:
+                continue
+            start, end = known.group_offsets[group], known.group_offsets[group + 1]
+            group_d2 = (
+                probes_sq[:, None] + known.squared_norms[None, start:end] - 2.0 * (probes @ known.matrix[start:end].T)
+            ).min(axis=1)
+            closer = group_d2 < best_d2
+            best_d2[closer] = group_d2[closer]
+            best_groups[closer] = group
+            if (best_d2 < self._early_exit_sq).all():
+                return best_groups, best_d2, known.group_names
+        
+        if known.ann_index is not None:
+            # faiss L2 indexes report squared distances
+            distances, rows = known.ann_index.search(np.ascontiguousarray(probes, dtype=np.float32), 1)
+            return known.row_groups[rows[:, 0]], distances[:, 0], known.group_names
+        
+        # One pass over the rows per probe, without the (faces, encodings) distance matrix
+        closest = recognition_kernels.closest_rows(known.matrix, probes)
+        if closest is not None:
+            rows, best_d2 = closest
+            return known.row_groups[rows], best_d2, known.group_names
+        
+        d2 = probes_sq[:, None] + known.squared_norms[None, :] - 2.0 * (probes @ known.matrix.T)
+        # Minimum over each person's contiguous block of rows -> (faces, people)
+        per_person_min = np.minimum.reduceat(d2, known.group_offsets[:-1], axis=1)
+        best_groups = per_person_min.argmin(axis=1)
+        best_d2 = per_person_min[np.arange(len(probes)), best_groups]
+        return best_groups, best_d2, known.group_names
+    
     def _process_all_faces(self, image_data: bytes) -> Dict:
         """
         Process all faces in an image and return recognition results for each.
         Returns: {
-            'faces': [{'face_index': int, 'known_person': bool, 'name_person': str, 'distance': float, 'location': tuple}],
+            'faces': [{'face_index': int, 'known_person': bool, 'name_person': str, 'distance': float, 'location': tuple, 'encoding': numpy array}],
             'total_faces': int,
-            'image': numpy array
+            'image': numpy array,
+            'pil_image': decoded PIL image of the upload, shared with the numpy array for cropping faces
         }
         """
-        image = face_recognition.load_image_file(BytesIO(image_data))
+        image, pil_image = decode_image(image_data)
+        face_locations = self._detect_faces(image, pil_image)
         
-        # Get all face locations using CNN model for better accuracy
-        face_locations = face_recognition.face_locations(image, model="cnn")
-        logger.info(f"Detected {len(face_locations)} face(s) in image using CNN model")
+        # Faces this small give unreliable encodings; drop them before the ResNet pass
+        detected_count = len(face_locations)
+        face_locations = [
+            (top, right, bottom, left)
+            for top, right, bottom, left in face_locations
+            if bottom - top >= self.min_face_size and right - left >= self.min_face_size
+        ]
+        if len(face_locations) < detected_count:
+            logger.info(f"Ignored {detected_count - len(face_locations)} face(s) smaller than {self.min_face_size}px")
         
         if not face_locations:
             return {
                 'faces': [],
                 'total_faces': 0,
-                'image': image
+                'image': image,
+                'pil_image': pil_image
             }
         
-        # Get encodings for all faces
-        face_encodings = face_recognition.face_encodings(image, face_locations)
+        # Get encodings for all faces in one pass. The 5-point "small" landmark model is
+        # faster than the 68-point one and only affects face alignment before the ResNet;
+        # it is slightly less robust on profile faces. No jittering: each jitter reruns
+        # the ResNet on a perturbed copy of every face.
+        face_encodings = face_recognition.face_encodings(image, face_locations, num_jitters=1, model="small")
+        probes = np.asarray(face_encodings, dtype=np.float32)
         
-        # Load known encodings
-        known_encodings = self._load_encodings()
+        best_groups, best_d2, group_names = self._match_encodings(probes)
         
         results = []
-        for i, (face_encoding, face_location) in enumerate(zip(face_encodings, face_locations)):
-            # Compare with all known faces
+        for i, face_location in enumerate(face_locations):
             best_match = None
-            best_distance = float('inf')
+            best_distance_sq = float('inf')
             
-            for name, person_encodings in known_encodings.items():
-                distances = face_recognition.face_distance(person_encodings, face_encoding)
-                min_distance = np.min(distances)
-                
-                if min_distance < best_distance:
-                    best_distance = min_distance
-                    best_match = name
+            if group_names:
+                best_group = int(best_groups[i])
+                best_match = group_names[best_group]
+                # Clamp to zero, rounding can push a near-identical match slightly negative
+                best_distance_sq = max(float(best_d2[i]), 0.0)
             
-            # Check if best match is within tolerance
-            known_person = bool(best_match is not None and best_distance <= self.tolerance)
+            # Check if best match is within tolerance; compared squared, the sqrt is
+            # only taken for the single reported distance
+            known_person = bool(best_match is not None and best_distance_sq <= self._tolerance_sq)
+            best_distance = math.sqrt(best_distance_sq)
             name_person = best_match if known_person else ""
             
             results.append({
@@ -84,15 +358,19 @@ class FaceRecognitionService:
                 'known_person': known_person,
                 'name_person': name_person,
                 'distance': float(best_distance) if best_match else None,
-                'location': face_location  # (top, right, bottom, left)
+                'location': face_location,  # (top, right, bottom, left)
+                'encoding': probes[i]
             })
             
             logger.info(f"Face {i}: known={known_person}, name={name_person}, distance={best_distance if best_match else 'N/A'}")
         
+        self._mark_recent([face['name_person'] for face in results if face['known_person']])
+        
         return {
             'faces': results,
             'total_faces': len(results),
-            'image': image
+            'image': image,
+            'pil_image': pil_image
         }
     
     def recognize_face(self, image_data: bytes) -> Tuple[bool, str]:
@@ -109,12 +387,35 @@ class FaceRecognitionService:
         first_face = result['faces'][0]
         return first_face['known_person'], first_face['name_person']
     
-    def recognize_all_faces(self, image_data: bytes) -> Dict:
+    def _save_unknown_face(self, pil_image: Image.Image, location: Tuple[int, int, int, int], encoding: np.ndarray, event_id: str) -> str:
+        """Crop a face from the source image, encode it as JPEG and save it as unknown."""
+        top, right, bottom, left = location
+        face_image = pil_image.crop((left, top, right, bottom))
+        if face_image.mode != 'RGB':
+            face_image = face_image.convert('RGB')
+        
+        # Convert to bytes
+        output = BytesIO()
+        face_image.save(output, format='JPEG', quality=85, optimize=True)
+        face_image_data = output.getvalue()
+        
+        # The saved image is the face crop itself, so storage does not need to find the face in it
+        width, height = face_image.size
+        unknown_face_id = self.storage.save_unknown_face(face_image_data, encoding=encoding, face_location=(0, width, height, 0))
+        logger.info(f"Saved unknown face from recognition: face_id={unknown_face_id}, event_id={event_id}")
+        return unknown_face_id
+    
+    def recognize_all_faces(self, image_data: bytes, defer_unknown_saves: bool = False) -> Dict:
         """
         Recognize all faces in the given image.
+        If defer_unknown_saves is set, unknown faces are not saved here; instead
+        'pending_unknown_faces' holds one callable per unknown face that saves it,
+        so the caller can run them after the response is sent.
         Returns: {
             'faces': [{'face_index': int, 'known_person': bool, 'name_person': str, 'distance': float}],
-            'total_faces': int
+            'total_faces': int,
+            'event_id': str,
+            'pending_unknown_faces': [callable]
         }
         """
         processed = self._process_all_faces(image_data)
@@ -124,25 +425,25 @@ class FaceRecognitionService:
         logger.info(f"Saved recognition event: event_id={event_id}, total_faces={processed['total_faces']}")
         
         # Save unknown faces separately to unknown faces list
-        for face_result in processed['faces']:
-            if not face_result['known_person']:
-                # Extract and save this specific face as unknown
-                top, right, bottom, left = face_result['location']
-                face_image = processed['image'][top:bottom, left:right]
-                
-                # Convert to bytes
-                from PIL import Image
-                pil_image = Image.fromarray(face_image)
-                output = BytesIO()
-                pil_image.save(output, format='JPEG', quality=95)
-                face_image_data = output.getvalue()
-                
-                unknown_face_id = self.storage.save_unknown_face(face_image_data)
-                logger.info(f"Saved unknown face from recognition: face_id={unknown_face_id}, event_id={event_id}")
+        pending_unknown_faces = [
+            partial(self._save_unknown_face, processed['pil_image'], face_result['location'], face_result['encoding'], event_id)
+            for face_result in processed['faces']
+            if not face_result['known_person']
+        ]
+        
+        if not defer_unknown_saves:
+            for save_unknown_face in pending_unknown_faces:
+                save_unknown_face()
+            pending_unknown_faces = []
+        
+        faces = [
+            {key: value for key, value in face_result.items() if key != 'encoding'}
+            for face_result in processed['faces']
+        ]
         
         return {
-            'faces': processed['faces'],
+            'faces': faces,
             'total_faces': processed['total_faces'],
-            'event_id': event_id
+            'event_id': event_id,
+            'pending_unknown_faces': pending_unknown_faces
         }
-
@@ -1,16 +1,17 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
 import os
+import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 import httpx
 
-from .models import RecognizeResponse, RecognizeAllResponse, SimpleRecognizeResponse, FaceResult, KnownFace, UnknownFace, NameFaceRequest, Settings
+from .models import RecognizeResponse, RecognizeAllResponse, SimpleRecognizeResponse, FaceResult, KnownFace, UnknownFace, NameFaceRequest, NameFacesRequest, Settings
 from .face_service import FaceRecognitionService
-from .storage import FaceStorage
+from .storage import FaceStorage, is_valid_entry_id
 
 # Configure logging
 logging.basicConfig(
@@ -30,9 +31,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-storage = FaceStorage()
-face_service = FaceRecognitionService(storage, tolerance=0.75)
+# Services are created on startup rather than at import time: the bulk encoder worker
+# processes are spawned, and spawn re-imports this module in each of them when the
+# server is started with python -m app.main
+storage: Optional[FaceStorage] = None
+face_service: Optional[FaceRecognitionService] = None
+
+
+@app.on_event("startup")
+async def startup():
+    """Create storage and the face service with the saved recognition settings, and the
+    shared HTTP client so webhook calls reuse pooled connections."""
+    global storage, face_service
+    storage = FaceStorage()
+    settings = storage.load_settings()
+    face_service = FaceRecognitionService(
+        storage,
+        tolerance=settings["tolerance"],
+        detector_model=settings["detector_model"],
+        min_face_size=settings["min_face_size"]
+    )
+    logger.info(f"Using tolerance={settings['tolerance']}, detector_model={settings['detector_model']}, min_face_size={settings['min_face_size']}")
+    
+    app.state.http = httpx.AsyncClient(timeout=5.0, limits=httpx.Limits(max_keepalive_connections=10))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close the shared HTTP client and storage worker pools."""
+    await app.state.http.aclose()
+    storage.close()
+
+
+# Upload limits; checked before the image is decoded
+ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+
+async def read_image_upload(image: UploadFile) -> bytes:
+    """Read an uploaded image, rejecting unsupported types and oversized files."""
+    if image.content_type not in ALLOWED_IMAGE_TYPES:
+        logger.warning(f"Rejected upload with unsupported content type: filename={image.filename}, content_type={image.content_type}")
+        raise HTTPException(status_code=415, detail="Unsupported image type, expected JPEG, PNG or WebP")
+    
+    buffer = bytearray()
+    while True:
+        chunk = await image.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > MAX_UPLOAD_BYTES:
+            logger.warning(f"Rejected upload larger than {MAX_UPLOAD_BYTES} bytes: filename={image.filename}")
+            raise HTTPException(status_code=413, detail=f"Image too large, maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    
+    return bytes(buffer)
+
+
+def check_entry_id(entry_id: str):
+    """Reject unknown face and recognition event IDs that are not plain directory names."""
+    if not is_valid_entry_id(entry_id):
+        logger.warning(f"Rejected invalid ID: id={entry_id!r}")
+        raise HTTPException(status_code=400, detail="Invalid ID")
+
 
 # Static files directory (will be created when React is built)
 static_dir = Path(__file__).parent.parent / "static"
@@ -40,21 +101,24 @@ static_dir.mkdir(exist_ok=True)  # Create directory if it doesn't exist
 
 
 @app.post("/api/recognize", response_model=SimpleRecognizeResponse)
-async def recognize_face(image: UploadFile = File(..., alias="image")):
+async def recognize_face(background_tasks: BackgroundTasks, image: UploadFile = File(..., alias="image")):
     """Recognize all faces in the uploaded image. Returns simplified format for API integration.
     Accepts form POST with field name 'image'."""
     try:
         logger.info(f"Received face recognition request: filename={image.filename}, content_type={image.content_type}")
-        image_data = await image.read()
+        image_data = await read_image_upload(image)
         logger.info(f"Image size: {len(image_data)} bytes")
         
-        # Load tolerance from settings and apply to face service
+        # Recognition settings are applied at startup and when they are updated; the
+        # webhook settings are read here
         settings = storage.load_settings()
-        tolerance = settings.get("tolerance", 0.75)
-        face_service.set_tolerance(tolerance)
-        logger.info(f"Using tolerance: {tolerance}")
         
-        result = face_service.recognize_all_faces(image_data)
+        # Detection and encoding block for hundreds of ms; run them off the event loop
+        result = await asyncio.to_thread(face_service.recognize_all_faces, image_data, defer_unknown_saves=True)
+        
+        # Cropping, JPEG encoding and writing unknown faces happens after the response is sent
+        for save_unknown_face in result['pending_unknown_faces']:
+            background_tasks.add_task(save_unknown_face)
         
         logger.info(f"Face recognition result: total_faces={result['total_faces']}, event_id={result.get('event_id')}")
         
@@ -72,7 +136,6 @@ async def recognize_face(image: UploadFile = File(..., alias="image")):
         # Trigger webhook if enabled and known person detected
         if known_person:
             try:
-                # Settings already loaded above, reuse it
                 if settings.get("webhook_enabled") and settings.get("webhook_url"):
                     webhook_url = settings["webhook_url"].strip()
                     if webhook_url:
@@ -81,13 +144,12 @@ async def recognize_face(image: UploadFile = File(..., alias="image")):
                             "tag": ",".join(name_persons)
                         }
                         
-                        # Make async GET request (non-blocking)
-                        async with httpx.AsyncClient(timeout=5.0) as client:
-                            try:
-                                response = await client.get(webhook_url, params=params)
-                                logger.info(f"Webhook called successfully: url={webhook_url}, status={response.status_code}")
-                            except Exception as webhook_error:
-                                logger.warning(f"Webhook call failed (non-blocking): url={webhook_url}, error={str(webhook_error)}")
+                        # Make async GET request (non-blocking) on the shared client
+                        try:
+                            response = await app.state.http.get(webhook_url, params=params)
+                            logger.info(f"Webhook called successfully: url={webhook_url}, status={response.status_code}")
+                        except Exception as webhook_error:
+                            logger.warning(f"Webhook call failed (non-blocking): url={webhook_url}, error={str(webhook_error)}")
             except Exception as webhook_exception:
                 # Don't fail the recognition request if webhook fails
                 logger.warning(f"Error processing webhook (non-blocking): {str(webhook_exception)}")
@@ -96,6 +158,8 @@ async def recognize_face(image: UploadFile = File(..., alias="image")):
             known_person=known_person,
             name_persons=name_persons
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error processing image for recognition: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
@@ -169,10 +233,10 @@ async def add_known_face(name: str, image: UploadFile = File(..., alias="image")
     logger.info(f"Adding known face: name={name}, filename={image.filename}")
     
     try:
-        image_data = await image.read()
+        image_data = await read_image_upload(image)
         logger.info(f"Image size: {len(image_data)} bytes")
         
-        success = storage.save_known_face(name, image_data)
+        success = await asyncio.to_thread(storage.save_known_face, name, image_data)
         
         if not success:
             logger.error(f"add_known_face failed: No face found in image - name={name}")
@@ -205,16 +269,17 @@ async def delete_known_face(name: str):
 
 
 @app.get("/api/unknown-faces", response_model=List[UnknownFace])
-async def get_unknown_faces():
-    """Get list of all unknown faces."""
-    faces = storage.get_unknown_faces()
+async def get_unknown_faces(limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0)):
+    """Get list of unknown faces, newest first; optionally one page of them."""
+    faces = storage.get_unknown_faces(limit=limit, offset=offset)
     return [UnknownFace(**f) for f in faces]
 
 
 @app.get("/api/unknown-faces/{face_id}/image")
 async def get_unknown_face_image(face_id: str):
     """Get the full image for an unknown face."""
-    image_path = storage.get_unknown_face_image_path(face_id)
+    check_entry_id(face_id)
+    image_path = await asyncio.to_thread(storage.get_unknown_face_image_path, face_id)
     
     if not image_path:
         logger.warning(f"get_unknown_face_image: Face not found - face_id={face_id}")
@@ -226,12 +291,13 @@ async def get_unknown_face_image(face_id: str):
 @app.get("/api/unknown-faces/{face_id}/face")
 async def get_unknown_face_face(face_id: str):
     """Get the cropped face image for an unknown face."""
-    face_path = storage.get_unknown_face_face_path(face_id)
+    check_entry_id(face_id)
+    face_path = await asyncio.to_thread(storage.get_unknown_face_face_path, face_id)
     
     if not face_path:
         logger.warning(f"get_unknown_face_face: Cropped face not found, trying full image - face_id={face_id}")
         # Fallback to full image if cropped face doesn't exist
-        image_path = storage.get_unknown_face_image_path(face_id)
+        image_path = await asyncio.to_thread(storage.get_unknown_face_image_path, face_id)
         if not image_path:
             raise HTTPException(status_code=404, detail="Face not found")
         return FileResponse(image_path, media_type="image/jpeg")
@@ -239,9 +305,39 @@ async def get_unknown_face_face(face_id: str):
     return FileResponse(face_path, media_type="image/jpeg")
 
 
+@app.post("/api/unknown-faces/name")
+async def name_unknown_faces(request: NameFacesRequest):
+    """Name several unknown faces as the same person, encoding them in one batch."""
+    if not request.name or not request.name.strip():
+        logger.warning(f"name_unknown_faces failed: Empty name provided for face_ids={request.face_ids}")
+        raise HTTPException(status_code=400, detail="Name is required")
+    
+    for face_id in request.face_ids:
+        check_entry_id(face_id)
+    
+    name = request.name.strip()
+    logger.info(f"Attempting to name unknown faces: face_ids={request.face_ids}, name={name}")
+    
+    try:
+        named_ids = await asyncio.to_thread(storage.name_unknown_faces, request.face_ids, name)
+        if not named_ids:
+            logger.error(f"Failed to name unknown faces: face_ids={request.face_ids}, name={name}")
+            raise HTTPException(status_code=404, detail="Faces not found or could not be processed")
+        
+        face_service.invalidate_cache()
+        logger.info(f"Successfully named unknown faces: face_ids={named_ids}, name={name}")
+        return {"message": f"{len(named_ids)} face(s) named successfully", "name": name, "face_ids": named_ids}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error naming faces: face_ids={request.face_ids}, name={name}, error={str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error naming faces: {str(e)}")
+
+
 @app.post("/api/unknown-faces/{face_id}/name")
 async def name_unknown_face(face_id: str, request: NameFaceRequest):
     """Name an unknown face (move it to known faces)."""
+    check_entry_id(face_id)
     if not request.name or not request.name.strip():
         logger.warning(f"name_unknown_face failed: Empty name provided for face_id={face_id}")
         raise HTTPException(status_code=400, detail="Name is required")
@@ -250,7 +346,7 @@ async def name_unknown_face(face_id: str, request: NameFaceRequest):
     logger.info(f"Attempting to name unknown face: face_id={face_id}, name={name}")
     
     try:
-        success = storage.name_unknown_face(face_id, name)
+        success = await asyncio.to_thread(storage.name_unknown_face, face_id, name)
         if not success:
             logger.error(f"Failed to name unknown face: face_id={face_id}, name={name} - storage.name_unknown_face returned False")
             raise HTTPException(status_code=404, detail="Face not found or could not be processed")
@@ -268,8 +364,9 @@ async def name_unknown_face(face_id: str, request: NameFaceRequest):
 @app.delete("/api/unknown-faces/{face_id}")
 async def delete_unknown_face(face_id: str):
     """Delete an unknown face."""
+    check_entry_id(face_id)
     try:
-        success = storage.delete_unknown_face(face_id)
+        success = await asyncio.to_thread(storage.delete_unknown_face, face_id)
         if not success:
             raise HTTPException(status_code=404, detail="Face not found")
         
@@ -281,10 +378,10 @@ async def delete_unknown_face(face_id: str):
 
 
 @app.get("/api/recognition-history")
-async def get_recognition_history():
-    """Get all recognition events."""
-    logger.info("Getting recognition history")
-    events = storage.get_recognition_history()
+async def get_recognition_history(limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0)):
+    """Get recognition events, newest first; optionally one page of them."""
+    logger.info(f"Getting recognition history: limit={limit}, offset={offset}")
+    events = storage.get_recognition_history(limit=limit, offset=offset)
     logger.info(f"Found {len(events)} recognition events")
     return events
 
@@ -292,6 +389,7 @@ async def get_recognition_history():
 @app.get("/api/recognition-history/{event_id}")
 async def get_recognition_event(event_id: str):
     """Get a specific recognition event."""
+    check_entry_id(event_id)
     logger.info(f"Getting recognition event: event_id={event_id}")
     event = storage.get_recognition_event(event_id)
     
@@ -305,7 +403,8 @@ async def get_recognition_event(event_id: str):
 @app.get("/api/recognition-history/{event_id}/original")
 async def get_recognition_original_image(event_id: str):
     """Get the original image for a recognition event."""
-    image_path = storage.get_recognition_image_path(event_id, "original")
+    check_entry_id(event_id)
+    image_path = await asyncio.to_thread(storage.get_recognition_image_path, event_id, "original")
     
     if not image_path:
         logger.warning(f"Original image not found for event: event_id={event_id}")
@@ -317,7 +416,8 @@ async def get_recognition_original_image(event_id: str):
 @app.get("/api/recognition-history/{event_id}/face/{face_index}")
 async def get_recognition_face_image(event_id: str, face_index: int):
     """Get a specific face image from a recognition event."""
-    image_path = storage.get_recognition_image_path(event_id, "face", face_index)
+    check_entry_id(event_id)
+    image_path = await asyncio.to_thread(storage.get_recognition_image_path, event_id, "face", face_index)
     
     if not image_path:
         logger.warning(f"Face image not found: event_id={event_id}, face_index={face_index}")
@@ -329,9 +429,10 @@ async def get_recognition_face_image(event_id: str, face_index: int):
 @app.delete("/api/recognition-history/{event_id}")
 async def delete_recognition_event(event_id: str):
     """Delete a recognition event."""
+    check_entry_id(event_id)
     logger.info(f"Deleting recognition event: event_id={event_id}")
     try:
-        success = storage.delete_recognition_event(event_id)
+        success = await asyncio.to_thread(storage.delete_recognition_event, event_id)
         if not success:
             raise HTTPException(status_code=404, detail="Recognition event not found")
         
@@ -347,16 +448,20 @@ async def delete_recognition_event(event_id: str):
 @app.post("/api/recognition-history/{event_id}/face/{face_index}/add-to-known")
 async def add_face_from_recognition(event_id: str, face_index: int, request: NameFaceRequest):
     """Add a face from a recognition event to known faces."""
+    check_entry_id(event_id)
     logger.info(f"Adding face from recognition event to known faces: event_id={event_id}, face_index={face_index}, name={request.name}")
     try:
         # Get the face image data from the recognition event
-        face_image_data = storage.get_recognition_face_image_data(event_id, face_index)
+        face_image_data = await asyncio.to_thread(storage.get_recognition_face_image_data, event_id, face_index)
         if not face_image_data:
             logger.warning(f"Face image not found: event_id={event_id}, face_index={face_index}")
             raise HTTPException(status_code=404, detail="Face image not found in recognition event")
         
+        # Reuse the encoding computed during recognition when available
+        encoding = await asyncio.to_thread(storage.get_recognition_face_encoding, event_id, face_index)
+        
         # Save it as a known face
-        success = storage.save_known_face(request.name, face_image_data)
+        success = await asyncio.to_thread(storage.save_known_face, request.name, face_image_data, encoding)
         if not success:
             logger.error(f"Failed to save known face: name={request.name}, event_id={event_id}, face_index={face_index}")
             raise HTTPException(status_code=500, detail="Failed to save face as known person")
@@ -391,11 +496,15 @@ async def update_settings(settings: Settings):
         settings_dict = {
             "webhook_url": settings.webhook_url or "",
             "webhook_enabled": settings.webhook_enabled,
-            "tolerance": settings.tolerance
+            "tolerance": settings.tolerance,
+            "detector_model": settings.detector_model,
+            "min_face_size": settings.min_face_size
         }
         
-        # Update face service tolerance immediately
+        # Update face service tolerance and detector immediately
         face_service.set_tolerance(settings.tolerance)
+        face_service.set_detector_model(settings.detector_model)
+        face_service.set_min_face_size(settings.min_face_size)
         
         success = storage.save_settings(settings_dict)
         if not success:
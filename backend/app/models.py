@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 
 
 class FaceResult(BaseModel):
@@ -40,8 +40,15 @@ class NameFaceRequest(BaseModel):
     name: str
 
 
+class NameFacesRequest(BaseModel):
+    face_ids: List[str]
+    name: str
+
+
 class Settings(BaseModel):
     webhook_url: Optional[str] = ""
     webhook_enabled: bool = False
     tolerance: float = Field(default=0.75, ge=0.0, le=1.0, description="Face recognition tolerance (0.0=strict, 1.0=lenient)")
+    detector_model: Literal["hog", "cnn"] = Field(default="hog", description="Face detector model. 'hog' is much faster on CPU; 'cnn' is more accurate for small, angled or poorly lit faces but 20-50x slower without a GPU. With 'hog', CNN is used as a fallback when no face is found")
+    min_face_size: int = Field(default=40, ge=0, le=1000, description="Minimum face width and height in pixels; smaller detections are ignored, as they are too small for a reliable encoding")
 
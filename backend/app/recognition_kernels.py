@@ -0,0 +1,60 @@
+import numpy as np
+from typing import Optional, Tuple
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Rows each parallel block scans for its own closest row before the blocks are reduced
+BLOCK_ROWS = 1024
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _closest_rows(matrix, probes, block_rows):
+        """Closest row of matrix to each probe and its squared distance, with the
+        difference, square, sum and argmin fused into one pass over the rows."""
+        n_probes = probes.shape[0]
+        n_blocks = (matrix.shape[0] + block_rows - 1) // block_rows
+        block_d2 = np.empty((n_probes, n_blocks), dtype=np.float32)
+        block_best = np.empty((n_probes, n_blocks), dtype=np.int64)
+        
+        for block in prange(n_blocks):
+            start = block * block_rows
+            end = min(start + block_rows, matrix.shape[0])
+            for p in range(n_probes):
+                best_d2 = np.inf
+                best_row = start
+                for row in range(start, end):
+                    total = np.float32(0.0)
+                    for j in range(matrix.shape[1]):
+                        diff = matrix[row, j] - probes[p, j]
+                        total += diff * diff
+                    if total < best_d2:
+                        best_d2 = total
+                        best_row = row
+                block_d2[p, block] = best_d2
+                block_best[p, block] = best_row
+        
+        rows = np.empty(n_probes, dtype=np.int64)
+        d2 = np.empty(n_probes, dtype=np.float32)
+        for p in range(n_probes):
+            block = np.argmin(block_d2[p])
+            rows[p] = block_best[p, block]
+            d2[p] = block_d2[p, block]
+        return rows, d2
+
+
+def closest_rows(matrix: np.ndarray, probes: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Return (closest row of matrix, squared distance) for each probe, or None when
+    numba is not installed. The first call compiles the kernel; cache=True keeps the
+    compiled code on disk for later runs."""
+    if njit is None or not len(matrix):
+        return None
+    
+    return _closest_rows(
+        np.ascontiguousarray(matrix, dtype=np.float32),
+        np.ascontiguousarray(probes, dtype=np.float32).reshape(-1, matrix.shape[1]),
+        BLOCK_ROWS
+    )
@@ -1,17 +1,113 @@
 import os
 import json
+import queue
 import shutil
+import sqlite3
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import numpy as np
 import face_recognition
 from PIL import Image
 from io import BytesIO
+from .encoder import decode_image, encode_images
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbojpeg = TurboJPEG()
+except Exception:
+    # Not installed, or libturbojpeg itself could not be loaded
+    _turbojpeg = None
 
 logger = logging.getLogger(__name__)
 
+# Per-person consolidated encodings: an append log of (N, 128) float32 rows, plus a JSON
+# list of the image file stems its rows belong to. The log starts with an 8-byte
+# little-endian row count; the file may be preallocated past the last row.
+ENCODINGS_FILE = "encodings.f32"
+ENCODINGS_INDEX_FILE = "encodings.json"
+ENCODINGS_HEADER_BYTES = 8
+ENCODING_ROW_BYTES = 128 * 4
+# Queued file writes, beyond which savers block until the writer thread catches up
+WRITE_QUEUE_SIZE = 256
+# Most files the writer thread writes before syncing them to disk together
+WRITE_BATCH_SIZE = 32
+# Fewest images each encoder worker process is given, since each worker loads its own
+# copy of dlib's models first; batches too small for two workers are encoded in-process
+ENCODE_IMAGES_PER_WORKER = 4
+# Known face images at least this large on their short side are probed for a face at half size
+FACE_PROBE_MIN_DIMENSION = 400
+JPEG_QUALITY = 85
+
+
+def _datasync(fd: int):
+    """Flush a file's data to disk; fdatasync where available (not on macOS)."""
+    getattr(os, "fdatasync", os.fsync)(fd)
+
+
+def _json_loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, indent=2 if indent else None)
+
+
+def _image_size(image_data: Union[bytes, Path]) -> int:
+    """Size in bytes of image data given as bytes or as a file path."""
+    return image_data.stat().st_size if isinstance(image_data, Path) else len(image_data)
+
+
+def _npy_bytes(array: np.ndarray) -> bytes:
+    """Serialize an encoding the way np.save would write it to a .npy file."""
+    output = BytesIO()
+    np.save(output, np.asarray(array, dtype=np.float32))
+    return output.getvalue()
+
+
+def _scan_dirs(path: Path) -> List[os.DirEntry]:
+    """List the subdirectories of path; DirEntry caches the type, so no stat per entry."""
+    with os.scandir(path) as entries:
+        return [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+
+def _scan_files(path: Path, suffix: str) -> List[str]:
+    """List the names of the regular files in path ending with suffix."""
+    with os.scandir(path) as entries:
+        return [entry.name for entry in entries if entry.name.endswith(suffix) and entry.is_file(follow_symlinks=False)]
+
+
+def is_valid_entry_id(entry_id: str) -> bool:
+    """Whether an unknown face or recognition event ID is a plain directory name, so
+    joining it onto its storage directory cannot reach outside that directory."""
+    return bool(entry_id) and ".." not in entry_id and not any(c in entry_id for c in "/\\\0")
+
+
+def _encode_jpeg(rgb: np.ndarray) -> bytes:
+    """Encode an RGB pixel array as JPEG, with libjpeg-turbo when available."""
+    if _turbojpeg is not None:
+        return _turbojpeg.encode(np.ascontiguousarray(rgb), quality=JPEG_QUALITY, pixel_format=TJPF_RGB)
+    
+    output = BytesIO()
+    Image.fromarray(rgb).save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
 
 class FaceStorage:
     def __init__(self, base_path: str = "faces"):
@@ -20,250 +116,749 @@ class FaceStorage:
         self.unknown_path = self.base_path / "unknown"
         self.recognitions_path = self.base_path / "recognitions"
         self.settings_path = self.base_path / "settings.json"
+        self.encoding_cache_path = self.base_path / "encodings_cache.npz"
+        self.db_path = self.base_path / "faces.db"
         
         # Create directories if they don't exist
         self.base_path.mkdir(parents=True, exist_ok=True)
         self.known_path.mkdir(parents=True, exist_ok=True)
         self.unknown_path.mkdir(parents=True, exist_ok=True)
         self.recognitions_path.mkdir(parents=True, exist_ok=True)
+        
+        # Serializes read-modify-write of the per-person encodings files
+        self._encodings_lock = threading.Lock()
+        # (settings file mtime_ns, parsed settings); settings are read on every recognition
+        self._settings_cache: Optional[Tuple[int, dict]] = None
+        self._migrate_legacy_encodings()
+        
+        # Unknown face and recognition event metadata lives in SQLite so listing
+        # them is one indexed query instead of a metadata.json read per directory
+        self._db_lock = threading.Lock()
+        # Overlaps JPEG encoding of face crops (which releases the GIL) with file writes
+        self._io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="storage-io")
+        # dlib encodes on one core, so bulk encoding fans out to worker processes,
+        # started on first use since each one loads its own copy of the models
+        self._encode_pool: Optional[ProcessPoolExecutor] = None
+        self._encode_pool_lock = threading.Lock()
+        # Unknown face and recognition event files are written, and synced to disk, by
+        # one background thread so saving them does not wait on the disk. Paths stay in
+        # _pending_writes until written, and readers of their directory wait for them.
+        self._write_queue: queue.Queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._pending_writes: Dict[Path, int] = {}
+        self._writes_done = threading.Condition()
+        self._writer = threading.Thread(target=self._drain_writes, name="storage-writer", daemon=True)
+        self._writer.start()
+        self.db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._init_db()
     
-    def _extract_face_image(self, image_data: bytes) -> Optional[bytes]:
-        """Extract and crop the first detected face from an image."""
-        try:
-            image = face_recognition.load_image_file(BytesIO(image_data))
-            face_locations = face_recognition.face_locations(image, model="cnn")
+    def _init_db(self):
+        """Create the metadata tables and import any metadata.json files from older versions."""
+        with self._db_lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS unknown_faces (id TEXT PRIMARY KEY, ts TEXT NOT NULL, has_face INTEGER NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_unknown_faces_ts ON unknown_faces (ts DESC)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS recognition_events (id TEXT PRIMARY KEY, ts TEXT NOT NULL, total INTEGER NOT NULL, faces_json TEXT NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_recognition_events_ts ON recognition_events (ts DESC)")
             
-            if not face_locations:
-                logger.warning("No faces detected in image for extraction")
-                return None
-            
-            # Use the first face (or largest if we want to be smarter)
-            top, right, bottom, left = face_locations[0]
+            if self.db.execute("PRAGMA user_version").fetchone()[0] < 1:
+                self._migrate_json_metadata()
+                self.db.execute("PRAGMA user_version = 1")
+    
+    def _migrate_json_metadata(self):
+        """One-shot import of per-directory metadata.json files into the database."""
+        unknown_rows = []
+        for metadata_file in self.unknown_path.glob("*/metadata.json"):
+            try:
+                metadata = _json_loads(metadata_file.read_bytes())
+                unknown_rows.append((metadata["id"], metadata["timestamp"], int(bool(metadata.get("has_face_image")))))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable unknown face metadata: path={metadata_file}, error={str(e)}")
+        
+        event_rows = []
+        for metadata_file in self.recognitions_path.glob("*/metadata.json"):
+            try:
+                metadata = _json_loads(metadata_file.read_bytes())
+                event_rows.append((metadata["event_id"], metadata.get("timestamp", ""), metadata.get("total_faces", 0), _json_dumps(metadata.get("faces", []))))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable recognition event metadata: path={metadata_file}, error={str(e)}")
+        
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany("INSERT OR IGNORE INTO unknown_faces (id, ts, has_face) VALUES (?, ?, ?)", unknown_rows)
+            self.db.executemany("INSERT OR IGNORE INTO recognition_events (id, ts, total, faces_json) VALUES (?, ?, ?, ?)", event_rows)
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        
+        if unknown_rows or event_rows:
+            logger.info(f"Migrated metadata to database: unknown_faces={len(unknown_rows)}, recognition_events={len(event_rows)}")
+    
+    def _entry_dir(self, parent: Path, entry_id: str) -> Optional[Path]:
+        """Directory of an unknown face or recognition event, or None for an ID that is
+        not a plain directory name (e.g. "../..")."""
+        if not is_valid_entry_id(entry_id):
+            logger.warning(f"Rejected invalid ID: id={entry_id!r}, directory={parent}")
+            return None
+        return parent / entry_id
+    
+    def _db_execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Run one statement on the shared connection and return its rows."""
+        with self._db_lock:
+            return self.db.execute(sql, params).fetchall()
+    
+    def _crop_face_image(self, image_data: bytes, face_location: Tuple[int, int, int, int]) -> Optional[bytes]:
+        """Crop a face at an already known (top, right, bottom, left) location, without detection."""
+        try:
+            top, right, bottom, left = face_location
+            with Image.open(BytesIO(image_data)) as pil_image:
+                # Only the header is read here
+                width, height = pil_image.size
             
-            # Convert to PIL Image for cropping
-            pil_image = Image.fromarray(image)
-            face_image = pil_image.crop((left, top, right, bottom))
+            # The image already is just the face, e.g. a crop from a recognition event
+            if (top, right, bottom, left) == (0, width, height, 0):
+                return image_data
             
-            # Convert back to bytes
-            output = BytesIO()
-            face_image.save(output, format='JPEG', quality=95)
-            return output.getvalue()
+            image = decode_image(image_data)[0]
+            return _encode_jpeg(image[max(0, top):bottom, max(0, left):right])
         except Exception as e:
-            logger.exception(f"Error extracting face from image: {str(e)}")
+            logger.exception(f"Error cropping face from image: {str(e)}")
             return None
     
-    def save_known_face(self, name: str, image_data: bytes) -> bool:
-        """Save a known face with its encoding."""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        person_dir = self.known_path / name
-        person_dir.mkdir(exist_ok=True)
+    def save_known_face(self, name: str, image_data: Union[bytes, Path], encoding: Optional[np.ndarray] = None, image: Optional[np.ndarray] = None) -> bool:
+        """Save a known face with its encoding.
         
+        If the encoding was already computed (e.g. the face came from a recognition
+        event), pass it in to skip face detection and encoding entirely. If the caller
+        already decoded image_data, pass the pixels as image to skip decoding it again.
+        image_data may also be the path of an image file, which is then copied as is
+        instead of being read into memory.
+        """
         try:
-            # Load image and find faces
-            logger.info(f"Processing image for known face: name={name}, image_size={len(image_data)} bytes")
-            
-            image = face_recognition.load_image_file(BytesIO(image_data))
-            
-            # Use CNN model for face detection (consistent with recognition)
-            face_locations = face_recognition.face_locations(image, model="cnn")
+            if encoding is not None:
+                logger.info(f"Using precomputed encoding for known face: name={name}, image_size={_image_size(image_data)} bytes")
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+                return self._write_known_faces(name, [(timestamp, encoding, image_data)])[0]
             
-            if not face_locations:
-                logger.warning(f"save_known_face failed: No face detected in image - name={name}")
-                return False
-            
-            # Get encodings for detected faces
-            face_encodings = face_recognition.face_encodings(image, face_locations)
+            if image is None:
+                image = decode_image(image_data)[0]
+            return self._save_known_face_ndarray(name, image, image_data)
+        except Exception as e:
+            logger.exception(f"save_known_face exception: name={name}, error={str(e)}")
+            return False
+    
+    def _save_known_face_ndarray(self, name: str, image: np.ndarray, original: Union[bytes, Path]) -> bool:
+        """Detect, encode and save the first face of an already decoded image."""
+        # Load image and find faces
+        logger.info(f"Processing image for known face: name={name}, image_size={_image_size(original)} bytes")
+        
+        # Probe for a face on a half size copy, with HOG first and CNN only if HOG misses
+        # (same order as recognition), so images without a face are rejected cheaply
+        step = 2 if min(image.shape[:2]) >= FACE_PROBE_MIN_DIMENSION else 1
+        small = np.ascontiguousarray(image[::step, ::step]) if step > 1 else image
+        face_locations = face_recognition.face_locations(small, model="hog")
+        if not face_locations:
+            face_locations = face_recognition.face_locations(small, model="cnn")
+        
+        if not face_locations:
+            logger.warning(f"save_known_face failed: No face detected in image - name={name}")
+            return False
+        
+        logger.info(f"Found {len(face_locations)} face(s) in image for name={name}, using first face")
+        
+        # Encode only the first face, at full resolution, with the same 5-point landmarks
+        # and single jitter as recognition so stored and live encodings are comparable
+        height, width = image.shape[:2]
+        top, right, bottom, left = face_locations[0]
+        location = (max(0, top * step), min(width, right * step), min(height, bottom * step), max(0, left * step))
+        face_encodings = face_recognition.face_encodings(image, known_face_locations=[location], num_jitters=1, model="small")
+        
+        if not face_encodings:
+            logger.warning(f"save_known_face failed: No face encodings generated - name={name}")
+            return False
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return self._write_known_faces(name, [(timestamp, face_encodings[0], original)])[0]
+    
+    def _read_person_stems(self, person_dir: Path) -> List[str]:
+        """Read the image stems of a person's encoding rows."""
+        index_file = person_dir / ENCODINGS_INDEX_FILE
+        if not index_file.exists():
+            return []
+        return _json_loads(index_file.read_bytes())
+    
+    def _write_person_stems(self, person_dir: Path, stems: List[str]):
+        """Atomically replace the image stems of a person's encoding rows."""
+        index_file = person_dir / ENCODINGS_INDEX_FILE
+        tmp_index = index_file.with_name(index_file.name + ".tmp")
+        tmp_index.write_text(_json_dumps(stems))
+        os.replace(tmp_index, index_file)
+    
+    def _read_person_encodings(self, person_dir: Path, mmap_mode: Optional[str] = "r") -> Tuple[np.ndarray, List[str]]:
+        """Read a person's consolidated encodings matrix and the image stems of its rows."""
+        encodings_file = person_dir / ENCODINGS_FILE
+        if not encodings_file.exists():
+            return np.empty((0, 128), dtype=np.float32), []
+        
+        with open(encodings_file, "rb") as f:
+            count = int.from_bytes(f.read(ENCODINGS_HEADER_BYTES), "little")
+            if mmap_mode is None or count == 0:
+                matrix = np.fromfile(f, dtype="<f4", count=count * 128).reshape(-1, 128)
+        if mmap_mode is not None and count:
+            matrix = np.memmap(encodings_file, dtype="<f4", mode=mmap_mode, offset=ENCODINGS_HEADER_BYTES, shape=(count, 128))
+        
+        stems = self._read_person_stems(person_dir)
+        # Rows without a recorded image (e.g. a lost index) stay usable for matching
+        stems += [""] * (len(matrix) - len(stems))
+        return matrix, stems[:len(matrix)]
+    
+    def _write_person_encodings(self, person_dir: Path, matrix: np.ndarray, stems: List[str]):
+        """Atomically replace a person's consolidated encodings matrix and row index."""
+        encodings_file = person_dir / ENCODINGS_FILE
+        matrix = np.ascontiguousarray(matrix, dtype="<f4").reshape(-1, 128)
+        
+        tmp_encodings = encodings_file.with_name(encodings_file.name + ".tmp")
+        with open(tmp_encodings, "wb") as f:
+            f.write(len(matrix).to_bytes(ENCODINGS_HEADER_BYTES, "little"))
+            f.write(matrix.tobytes())
+        
+        self._write_person_stems(person_dir, stems)
+        os.replace(tmp_encodings, encodings_file)
+    
+    def _append_person_encodings(self, person_dir: Path, rows: np.ndarray, new_stems: List[str]):
+        """Append rows to a person's encodings log in place.
+        
+        Only the new rows and the count header are written, so the cost does not grow
+        with the number of encodings already stored. Capacity doubles when the file is full.
+        """
+        encodings_file = person_dir / ENCODINGS_FILE
+        rows = np.ascontiguousarray(rows, dtype="<f4").reshape(-1, 128)
+        stems = self._read_person_stems(person_dir) if encodings_file.exists() else []
+        
+        fd = os.open(encodings_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, ENCODINGS_HEADER_BYTES, 0)
+            count = int.from_bytes(header, "little") if len(header) == ENCODINGS_HEADER_BYTES else 0
+            capacity = max(0, os.fstat(fd).st_size - ENCODINGS_HEADER_BYTES) // ENCODING_ROW_BYTES
             
-            if not face_encodings:
-                logger.warning(f"save_known_face failed: No face encodings generated - name={name}")
-                return False
+            if count + len(rows) > capacity:
+                capacity = max(capacity, 16)
+                while capacity < count + len(rows):
+                    capacity *= 2
+                os.ftruncate(fd, ENCODINGS_HEADER_BYTES + capacity * ENCODING_ROW_BYTES)
             
-            logger.info(f"Found {len(face_encodings)} face(s) in image for name={name}, using first face")
+            os.pwrite(fd, rows.tobytes(), ENCODINGS_HEADER_BYTES + count * ENCODING_ROW_BYTES)
+            _datasync(fd)
             
-            # Use the first face found
-            encoding = face_encodings[0]
+            # Rows beyond the index are tolerated by readers, so the stems go before the count
+            self._write_person_stems(person_dir, (stems + [""] * count)[:count] + list(new_stems))
+            os.pwrite(fd, (count + len(rows)).to_bytes(ENCODINGS_HEADER_BYTES, "little"), 0)
+            _datasync(fd)
+        finally:
+            os.close(fd)
+    
+    def _migrate_legacy_encodings(self):
+        """One-time migration of per-face <stem>.npy files into each person's encodings log."""
+        for entry in _scan_dirs(self.known_path):
+            person_dir = Path(entry.path)
+            legacy_files = sorted(person_dir / f for f in _scan_files(person_dir, ".npy"))
+            if not legacy_files:
+                continue
             
-            # Save encoding
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            encoding_file = person_dir / f"{timestamp}.npy"
             try:
-                np.save(encoding_file, encoding)
-                logger.info(f"Saved face encoding: name={name}, encoding_file={encoding_file}")
+                with self._encodings_lock:
+                    matrix, stems = self._read_person_encodings(person_dir, mmap_mode=None)
+                    legacy = [np.load(f).astype(np.float32, copy=False).reshape(128) for f in legacy_files]
+                    matrix = np.vstack([matrix] + legacy)
+                    stems = stems + [f.stem for f in legacy_files]
+                    self._write_person_encodings(person_dir, matrix, stems)
+                
+                for legacy_file in legacy_files:
+                    legacy_file.unlink()
+                logger.info(f"Migrated encodings for name={person_dir.name}: files={len(legacy_files)}, encodings={len(matrix)}")
             except Exception as e:
-                logger.error(f"save_known_face failed: Could not save encoding - name={name}, error={str(e)}")
-                return False
-            
-            # Save original image
-            image_file = person_dir / f"{timestamp}.jpg"
+                logger.error(f"Failed to migrate encodings: name={person_dir.name}, error={str(e)}")
+    
+    def _write_known_faces(self, name: str, faces: List[Tuple[str, np.ndarray, Union[bytes, Path]]]) -> List[bool]:
+        """
+        Write known faces given as (stem, encoding, image_data): each original image as
+        <stem>.jpg, and all encodings appended to the person's consolidated file at once.
+        image_data given as a Path is copied file to file, in the kernel where supported.
+        Returns whether each face was saved.
+        """
+        person_dir = self.known_path / name
+        person_dir.mkdir(exist_ok=True)
+        
+        # Save original images
+        saved = []
+        for stem, encoding, image_data in faces:
+            image_file = person_dir / f"{stem}.jpg"
             try:
-                with open(image_file, "wb") as f:
-                    f.write(image_data)
+                if isinstance(image_data, Path):
+                    shutil.copyfile(image_data, image_file)
+                else:
+                    with open(image_file, "wb") as f:
+                        f.write(image_data)
                 logger.info(f"Saved face image: name={name}, image_file={image_file}")
+                saved.append(True)
             except Exception as e:
                 logger.error(f"save_known_face failed: Could not save image - name={name}, error={str(e)}")
-                return False
-            
-            return True
+                saved.append(False)
+        
+        new_faces = [(stem, encoding) for (stem, encoding, _), ok in zip(faces, saved) if ok]
+        if not new_faces:
+            return saved
+        
+        # Append encodings, stored as float32 to halve their size
+        try:
+            with self._encodings_lock:
+                new_rows = [np.asarray(encoding, dtype=np.float32).reshape(128) for _, encoding in new_faces]
+                self._append_person_encodings(person_dir, np.vstack(new_rows), [stem for stem, _ in new_faces])
+            logger.info(f"Saved {len(new_faces)} face encoding(s): name={name}, encodings_file={person_dir / ENCODINGS_FILE}")
         except Exception as e:
-            logger.exception(f"save_known_face exception: name={name}, error={str(e)}")
-            return False
+            logger.error(f"save_known_face failed: Could not save encoding - name={name}, error={str(e)}")
+            for stem, _ in new_faces:
+                (person_dir / f"{stem}.jpg").unlink(missing_ok=True)
+            return [False] * len(faces)
+        
+        return saved
     
-    def load_known_encodings(self) -> dict:
-        """Load all known face encodings from filesystem."""
-        encodings = {}
+    def _get_encode_pool(self) -> ProcessPoolExecutor:
+        """Return the encoder process pool, starting it if needed."""
+        with self._encode_pool_lock:
+            if self._encode_pool is None:
+                # spawn rather than fork: forking a process with running threads is unsafe
+                self._encode_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._encode_pool
+    
+    def _encode_images_parallel(self, images_data: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Encode the first face of each image, spread over the encoder processes.
+        Image bytes rather than decoded pixels are sent to keep pickling cheap, and each
+        worker still encodes its share of the images in one batch."""
+        workers = min(len(images_data) // ENCODE_IMAGES_PER_WORKER, os.cpu_count() or 1)
+        if workers < 2:
+            return encode_images(images_data)
         
-        for person_dir in self.known_path.iterdir():
-            if not person_dir.is_dir():
-                continue
+        chunks = [images_data[i::workers] for i in range(workers)]
+        encodings: List[Optional[np.ndarray]] = [None] * len(images_data)
+        for i, chunk_encodings in enumerate(self._get_encode_pool().map(encode_images, chunks)):
+            encodings[i::workers] = chunk_encodings
+        return encodings
+    
+    def _reserve_write(self, path: Path):
+        """Mark a file as about to be queued, so readers wait for it."""
+        with self._writes_done:
+            self._pending_writes[path] = self._pending_writes.get(path, 0) + 1
+    
+    def _release_write(self, path: Path):
+        """Mark a reserved file as written (or failed) and wake up waiting readers."""
+        with self._writes_done:
+            remaining = self._pending_writes.get(path, 1) - 1
+            if remaining:
+                self._pending_writes[path] = remaining
+            else:
+                self._pending_writes.pop(path, None)
+            self._writes_done.notify_all()
+    
+    def _queue_write(self, path: Path, data: bytes, reserved: bool = False, on_failure: Optional[Callable[[], None]] = None):
+        """Queue a file for the writer thread; blocks while the queue is full.
+        on_failure is called from the writer thread if the file could not be written,
+        so the metadata referring to it can be rolled back."""
+        if not reserved:
+            self._reserve_write(path)
+        self._write_queue.put((path, data, on_failure))
+    
+    def _wait_for_writes(self, directory: Path):
+        """Block until no queued file in directory is still waiting to be written."""
+        with self._writes_done:
+            self._writes_done.wait_for(lambda: not any(path.parent == directory for path in self._pending_writes))
+    
+    def _drain_writes(self):
+        """Writer thread: write queued files in batches, syncing each batch to disk together."""
+        while True:
+            batch = [self._write_queue.get()]
+            while batch[-1] is not None and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
             
-            name = person_dir.name
-            person_encodings = []
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
             
-            for encoding_file in person_dir.glob("*.npy"):
-                encoding = np.load(encoding_file)
-                person_encodings.append(encoding)
+            failed = []
+            written = []
+            for path, data, on_failure in batch:
+                try:
+                    f = open(path, "wb")
+                    written.append((path, f, on_failure))
+                    f.write(data)
+                except Exception as e:
+                    logger.error(f"Failed to write file: path={path}, error={str(e)}")
+                    failed.append((path, on_failure))
+            
+            for path, f, on_failure in written:
+                try:
+                    f.flush()
+                    _datasync(f.fileno())
+                except Exception as e:
+                    logger.error(f"Failed to sync file: path={path}, error={str(e)}")
+                    if (path, on_failure) not in failed:
+                        failed.append((path, on_failure))
+                finally:
+                    f.close()
+            
+            # Readers are released only after the metadata was rolled back
+            for path, on_failure in failed:
+                path.unlink(missing_ok=True)
+                if on_failure is not None:
+                    try:
+                        on_failure()
+                    except Exception as e:
+                        logger.error(f"Failed to record write failure: path={path}, error={str(e)}")
             
-            if person_encodings:
-                encodings[name] = person_encodings
+            for path, _, _ in batch:
+                self._release_write(path)
+            if stop:
+                return
+    
+    def close(self):
+        """Stop the worker pools, finish queued writes and close the metadata database."""
+        with self._encode_pool_lock:
+            if self._encode_pool is not None:
+                self._encode_pool.shutdown(cancel_futures=True)
+                self._encode_pool = None
+        self._io_executor.shutdown()
+        self._write_queue.put(None)
+        self._writer.join()
+        with self._db_lock:
+            self.db.close()
+    
+    def save_known_faces_bulk(self, name: str, images_data: List[bytes], encodings: Optional[List[Optional[np.ndarray]]] = None) -> List[bool]:
+        """
+        Save several known faces for one person, encoding all of them in one batch.
+        Precomputed encodings may be passed per image (None where unknown).
+        Returns whether each image was saved.
+        """
+        if encodings is None:
+            encodings = [None] * len(images_data)
+        encodings = list(encodings)
+        
+        logger.info(f"Processing {len(images_data)} image(s) for known face: name={name}")
+        
+        pending = [i for i, encoding in enumerate(encodings) if encoding is None]
+        if pending:
+            try:
+                for i, encoding in zip(pending, self._encode_images_parallel([images_data[i] for i in pending])):
+                    encodings[i] = encoding
+            except Exception as e:
+                logger.exception(f"save_known_faces_bulk exception while encoding: name={name}, error={str(e)}")
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        faces = []
+        for i, (image_data, encoding) in enumerate(zip(images_data, encodings)):
+            if encoding is None:
+                logger.warning(f"save_known_faces_bulk: No face encoding for image {i} - name={name}")
+                continue
+            faces.append((i, (f"{timestamp}_{i:03d}", encoding, image_data)))
+        
+        saved = [False] * len(images_data)
+        if faces:
+            for (i, _), ok in zip(faces, self._write_known_faces(name, [face for _, face in faces])):
+                saved[i] = ok
+        
+        logger.info(f"Saved {sum(saved)} of {len(images_data)} known face(s): name={name}")
+        return saved
+    
+    def load_known_encodings(self) -> dict:
+        """Load all known face encodings as {name: (N, 128) memory-mapped array}."""
+        encodings = {}
+        
+        for entry in _scan_dirs(self.known_path):
+            matrix, _ = self._read_person_encodings(Path(entry.path))
+            if len(matrix):
+                encodings[entry.name] = matrix
         
         return encodings
     
-    def save_unknown_face(self, image_data: bytes) -> str:
-        """Save an unknown face and return its ID."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        face_id = f"unknown_{timestamp}"
+    def scan_known_encodings(self) -> Dict[str, int]:
+        """List the mtime of every person's encodings file as {name: mtime_ns} without loading them."""
+        mtimes = {}
         
-        face_dir = self.unknown_path / face_id
-        face_dir.mkdir(exist_ok=True)
+        for entry in _scan_dirs(self.known_path):
+            try:
+                mtimes[entry.name] = os.stat(os.path.join(entry.path, ENCODINGS_FILE)).st_mtime_ns
+            except FileNotFoundError:
+                continue
         
-        # Save full image
-        image_file = face_dir / "image.jpg"
+        return mtimes
+    
+    def load_person_encodings(self, name: str) -> np.ndarray:
+        """Load one person's encodings as a memory-mapped (N, 128) float32 array."""
+        return self._read_person_encodings(self.known_path / name)[0]
+    
+    def save_encoding_cache(self, entries: Dict[str, Tuple[int, np.ndarray]]) -> bool:
+        """Persist all known encodings, with the mtime of the file each person's rows
+        were loaded from, so startup only has to load people that changed since."""
+        names = list(entries)
+        offsets = np.cumsum([0] + [len(entries[name][1]) for name in names])
+        
+        tmp_path = self.encoding_cache_path.with_suffix(".tmp")
         try:
-            with open(image_file, "wb") as f:
-                f.write(image_data)
-            logger.info(f"Saved unknown face full image: face_id={face_id}, size={len(image_data)} bytes")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    matrix=np.vstack([entries[name][1] for name in names]).astype(np.float32, copy=False) if names else np.empty((0, 128), dtype=np.float32),
+                    names=np.array(names, dtype=str),
+                    offsets=offsets.astype(np.int64),
+                    mtimes=np.array([entries[name][0] for name in names], dtype=np.int64)
+                )
+            os.replace(tmp_path, self.encoding_cache_path)
+            logger.info(f"Saved encoding cache: path={self.encoding_cache_path}, encodings={offsets[-1]}")
+            return True
         except Exception as e:
-            logger.error(f"Failed to save unknown face image: face_id={face_id}, error={str(e)}")
-            raise
+            logger.warning(f"Failed to save encoding cache: error={str(e)}")
+            return False
+    
+    def load_encoding_cache(self) -> Dict[str, Tuple[int, np.ndarray]]:
+        """Load the persisted encodings as {name: (mtime_ns, encodings)}, empty if missing."""
+        entries = {}
+        if not self.encoding_cache_path.exists():
+            return entries
+        
+        try:
+            with np.load(self.encoding_cache_path, allow_pickle=False) as cache:
+                matrix = cache["matrix"]
+                offsets = cache["offsets"].tolist()
+                for i, (name, mtime_ns) in enumerate(zip(cache["names"].tolist(), cache["mtimes"].tolist())):
+                    entries[name] = (mtime_ns, matrix[offsets[i]:offsets[i + 1]])
+        except Exception as e:
+            logger.warning(f"Failed to load encoding cache: error={str(e)}")
+            return {}
+        
+        return entries
+    
+    def _unknown_face_image_lost(self, face_id: str):
+        """Drop an unknown face whose image could not be written."""
+        logger.error(f"Removing unknown face whose image was not saved: face_id={face_id}")
+        self._db_execute("DELETE FROM unknown_faces WHERE id = ?", (face_id,))
+        shutil.rmtree(self.unknown_path / face_id, ignore_errors=True)
+    
+    def _unknown_face_crop_lost(self, face_id: str):
+        """Record that an unknown face's cropped image could not be written."""
+        logger.error(f"Unknown face cropped image was not saved: face_id={face_id}")
+        self._db_execute("UPDATE unknown_faces SET has_face = 0 WHERE id = ?", (face_id,))
+    
+    def save_unknown_face(self, image_data: bytes, face_location: Tuple[int, int, int, int], encoding: Optional[np.ndarray] = None) -> str:
+        """Save an unknown face and return its ID.
+        
+        face_location is the face's (top, right, bottom, left) location in image_data,
+        as found by recognition; the face is cropped there without detecting it again.
+        The encoding, if known, is kept so naming the face later can skip re-encoding it.
+        """
+        now = datetime.now()
+        face_id = f"unknown_{now.strftime('%Y%m%d_%H%M%S_%f')}"
         
-        # Extract and save cropped face
-        face_image_data = self._extract_face_image(image_data)
+        face_dir = self.unknown_path / face_id
+        face_dir.mkdir(exist_ok=True)
+        
+        # Crop the face
+        face_image_data = self._crop_face_image(image_data, face_location)
+        if not face_image_data:
+            logger.warning(f"Could not crop face from image: face_id={face_id}")
+        
+        # _crop_face_image hands back image_data itself when the image already is just the
+        # face; it is then stored once, as image.jpg, which also serves as the face image
+        has_face = face_image_data is not None
+        if face_image_data is image_data:
+            face_image_data = None
+        
+        # Reserve the files so readers wait for them, index the face, then queue the
+        # files; a failed write rolls the row back, which needs the row to exist first
+        image_file = face_dir / "image.jpg"
+        face_file = face_dir / "face.jpg"
+        self._reserve_write(image_file)
         if face_image_data:
-            face_file = face_dir / "face.jpg"
-            try:
-                with open(face_file, "wb") as f:
-                    f.write(face_image_data)
-                logger.info(f"Saved unknown face cropped image: face_id={face_id}, size={len(face_image_data)} bytes")
-            except Exception as e:
-                logger.warning(f"Failed to save cropped face (continuing anyway): face_id={face_id}, error={str(e)}")
-        else:
-            logger.warning(f"Could not extract face from image: face_id={face_id}")
+            self._reserve_write(face_file)
         
         # Save metadata
-        metadata = {
-            "id": face_id,
-            "timestamp": datetime.now().isoformat(),
-            "image_path": str(image_file.relative_to(self.base_path)),
-            "has_face_image": face_image_data is not None
-        }
-        
-        metadata_file = face_dir / "metadata.json"
         try:
-            with open(metadata_file, "w") as f:
-                json.dump(metadata, f)
+            self._db_execute(
+                "INSERT INTO unknown_faces (id, ts, has_face) VALUES (?, ?, ?)",
+                (face_id, now.isoformat(), int(has_face))
+            )
         except Exception as e:
             logger.error(f"Failed to save metadata: face_id={face_id}, error={str(e)}")
+            self._release_write(image_file)
+            if face_image_data:
+                self._release_write(face_file)
             raise
         
+        # Save full image
+        self._queue_write(image_file, image_data, reserved=True, on_failure=partial(self._unknown_face_image_lost, face_id))
+        logger.info(f"Queued unknown face full image: face_id={face_id}, size={len(image_data)} bytes")
+        
+        if face_image_data:
+            self._queue_write(face_file, face_image_data, reserved=True, on_failure=partial(self._unknown_face_crop_lost, face_id))
+            logger.info(f"Queued unknown face cropped image: face_id={face_id}, size={len(face_image_data)} bytes")
+        
+        # The encoding is only a shortcut: without it, naming re-encodes the image
+        if encoding is not None:
+            self._queue_write(face_dir / "encoding.npy", _npy_bytes(encoding))
+        
         return face_id
     
-    def get_unknown_faces(self) -> List[dict]:
-        """Get list of all unknown faces."""
+    def get_unknown_faces(self, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """Get list of unknown faces, newest first; limit and offset select one page."""
         unknown_faces = []
         
-        for face_dir in self.unknown_path.iterdir():
-            if not face_dir.is_dir():
-                continue
-            
-            metadata_file = face_dir / "metadata.json"
-            if not metadata_file.exists():
-                continue
-            
-            with open(metadata_file, "r") as f:
-                metadata = json.load(f)
-            
-            # Add image URL paths
-            image_path = face_dir / "image.jpg"
-            face_path = face_dir / "face.jpg"
-            if image_path.exists():
-                metadata["image_url"] = f"/api/unknown-faces/{metadata['id']}/image"
-                if face_path.exists():
-                    metadata["face_url"] = f"/api/unknown-faces/{metadata['id']}/face"
-                unknown_faces.append(metadata)
-        
-        # Sort by timestamp (newest first)
-        unknown_faces.sort(key=lambda x: x["timestamp"], reverse=True)
+        rows = self._db_execute(
+            "SELECT id, ts, has_face FROM unknown_faces ORDER BY ts DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        )
+        for face_id, ts, has_face in rows:
+            metadata = {
+                "id": face_id,
+                "timestamp": ts,
+                "image_path": f"{self.unknown_path.name}/{face_id}/image.jpg",
+                "has_face_image": bool(has_face),
+                "image_url": f"/api/unknown-faces/{face_id}/image"
+            }
+            if has_face:
+                metadata["face_url"] = f"/api/unknown-faces/{face_id}/face"
+            unknown_faces.append(metadata)
+        
         return unknown_faces
     
-    def name_unknown_face(self, face_id: str, name: str) -> bool:
-        """Move an unknown face to known faces."""
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        unknown_dir = self.unknown_path / face_id
+    def _find_unknown_face(self, face_id: str, name: str) -> Optional[Tuple[Path, Optional[np.ndarray]]]:
+        """Find the image file (cropped face if available) and stored encoding of an unknown face."""
+        unknown_dir = self._entry_dir(self.unknown_path, face_id)
+        if unknown_dir is None:
+            return None
+        self._wait_for_writes(unknown_dir)
         if not unknown_dir.exists():
             logger.error(f"name_unknown_face failed: Unknown face directory does not exist - face_id={face_id}, path={unknown_dir}")
-            return False
+            return None
         
         # Try to use cropped face image first, fallback to full image
         face_file = unknown_dir / "face.jpg"
         image_file = unknown_dir / "image.jpg"
         
-        image_data = None
-        if face_file.exists():
+        if face_file.exists() and face_file.stat().st_size:
+            logger.info(f"Using cropped face image for naming: face_id={face_id}, name={name}, path={face_file}")
+        elif image_file.exists():
+            face_file = image_file
+            logger.info(f"Using full image for naming: face_id={face_id}, name={name}, path={image_file}")
+        else:
+            logger.error(f"name_unknown_face failed: No image file found - face_id={face_id}")
+            return None
+        
+        encoding = None
+        encoding_file = unknown_dir / "encoding.npy"
+        if encoding_file.exists():
             try:
-                with open(face_file, "rb") as f:
-                    image_data = f.read()
-                logger.info(f"Using cropped face image for naming: face_id={face_id}, name={name}, size={len(image_data)} bytes")
+                encoding = np.load(encoding_file)
             except Exception as e:
-                logger.warning(f"Could not read cropped face image, trying full image: face_id={face_id}, error={str(e)}")
+                logger.warning(f"Could not read stored encoding, re-encoding image: face_id={face_id}, error={str(e)}")
+        
+        return face_file, encoding
+    
+    def _read_unknown_face(self, face_id: str, name: str) -> Optional[Tuple[bytes, Optional[np.ndarray]]]:
+        """Read the image (cropped face if available) and stored encoding of an unknown face."""
+        unknown_face = self._find_unknown_face(face_id, name)
+        if unknown_face is None:
+            return None
+        image_file, encoding = unknown_face
+        
+        try:
+            return image_file.read_bytes(), encoding
+        except Exception as e:
+            logger.error(f"name_unknown_face failed: Could not read image file - face_id={face_id}, path={image_file}, error={str(e)}")
+            return None
+    
+    def _remove_named_unknown_face(self, face_id: str):
+        """Delete an unknown face directory after it was moved to known faces."""
+        unknown_dir = self._entry_dir(self.unknown_path, face_id)
+        if unknown_dir is None:
+            return
+        try:
+            self._db_execute("DELETE FROM unknown_faces WHERE id = ?", (face_id,))
+            self._wait_for_writes(unknown_dir)
+            shutil.rmtree(unknown_dir)
+            logger.info(f"Deleted unknown face directory: face_id={face_id}, path={unknown_dir}")
+        except Exception as e:
+            logger.warning(f"Failed to delete unknown face directory (face already moved): face_id={face_id}, error={str(e)}")
+            # Don't fail the operation if deletion fails - the face was already moved
+    
+    def name_unknown_face(self, face_id: str, name: str) -> bool:
+        """Move an unknown face to known faces."""
+        unknown_face = self._find_unknown_face(face_id, name)
+        if unknown_face is None:
+            return False
+        image_file, encoding = unknown_face
         
-        if not image_data and image_file.exists():
+        # The file is copied rather than read; without a stored encoding, PIL decodes it
+        # straight from disk and the pixels go to the encoder
+        image = None
+        if encoding is None:
             try:
-                with open(image_file, "rb") as f:
-                    image_data = f.read()
-                logger.info(f"Using full image for naming: face_id={face_id}, name={name}, size={len(image_data)} bytes")
+                image = decode_image(image_file)[0]
             except Exception as e:
-                logger.error(f"name_unknown_face failed: Could not read image file - face_id={face_id}, path={image_file}, error={str(e)}")
+                logger.error(f"name_unknown_face failed: Could not decode image - face_id={face_id}, error={str(e)}")
                 return False
         
-        if not image_data:
-            logger.error(f"name_unknown_face failed: No image file found - face_id={face_id}")
-            return False
-        
         # Save as known face
         logger.info(f"Attempting to save as known face: name={name}, face_id={face_id}")
-        if not self.save_known_face(name, image_data):
+        if not self.save_known_face(name, image_file, encoding=encoding, image=image):
             logger.error(f"name_unknown_face failed: save_known_face returned False - name={name}, face_id={face_id}. Possible reasons: no face detected in image, face encoding failed")
             return False
         
         logger.info(f"Successfully saved as known face: name={name}, face_id={face_id}")
         
-        # Delete unknown face directory
-        try:
-            shutil.rmtree(unknown_dir)
-            logger.info(f"Deleted unknown face directory: face_id={face_id}, path={unknown_dir}")
-        except Exception as e:
-            logger.warning(f"Failed to delete unknown face directory (face already moved): face_id={face_id}, error={str(e)}")
-            # Don't fail the operation if deletion fails - the face was already moved
-        
+        self._remove_named_unknown_face(face_id)
         return True
     
+    def name_unknown_faces(self, face_ids: List[str], name: str) -> List[str]:
+        """Move several unknown faces to the same known person, encoding them in one batch.
+        Returns the IDs of the faces that were named."""
+        read_ids = []
+        images_data = []
+        encodings = []
+        for face_id in face_ids:
+            unknown_face = self._read_unknown_face(face_id, name)
+            if unknown_face is None:
+                continue
+            read_ids.append(face_id)
+            images_data.append(unknown_face[0])
+            encodings.append(unknown_face[1])
+        
+        if not read_ids:
+            return []
+        
+        logger.info(f"Attempting to save {len(read_ids)} unknown face(s) as known face: name={name}")
+        saved = self.save_known_faces_bulk(name, images_data, encodings)
+        
+        named_ids = []
+        for face_id, was_saved in zip(read_ids, saved):
+            if not was_saved:
+                logger.error(f"name_unknown_faces: could not save face - name={name}, face_id={face_id}. Possible reasons: no face detected in image, face encoding failed")
+                continue
+            self._remove_named_unknown_face(face_id)
+            named_ids.append(face_id)
+        
+        return named_ids
+    
     def delete_unknown_face(self, face_id: str) -> bool:
         """Delete an unknown face."""
-        unknown_dir = self.unknown_path / face_id
+        unknown_dir = self._entry_dir(self.unknown_path, face_id)
+        if unknown_dir is None:
+            return False
+        self._db_execute("DELETE FROM unknown_faces WHERE id = ?", (face_id,))
+        self._wait_for_writes(unknown_dir)
         if unknown_dir.exists():
             shutil.rmtree(unknown_dir)
             return True
@@ -306,15 +901,17 @@ class FaceStorage:
             logger.error(f"Failed to delete image file: name={name}, filename={filename}, error={str(e)}")
             return False
         
-        # Delete corresponding encoding file if it exists
-        encoding_filename = filename.replace('.jpg', '.npy')
-        encoding_file = person_dir / encoding_filename
-        if encoding_file.exists():
-            try:
-                encoding_file.unlink()
-                logger.info(f"Deleted face encoding: name={name}, filename={encoding_filename}")
-            except Exception as e:
-                logger.warning(f"Failed to delete encoding file: name={name}, filename={encoding_filename}, error={str(e)}")
+        # Delete the corresponding row from the person's encodings
+        stem = Path(filename).stem
+        try:
+            with self._encodings_lock:
+                matrix, stems = self._read_person_encodings(person_dir, mmap_mode=None)
+                if stem in stems:
+                    row = stems.index(stem)
+                    self._write_person_encodings(person_dir, np.delete(matrix, row, axis=0), stems[:row] + stems[row + 1:])
+                    logger.info(f"Deleted face encoding: name={name}, filename={filename}")
+        except Exception as e:
+            logger.warning(f"Failed to delete face encoding: name={name}, filename={filename}, error={str(e)}")
         
         return True
     
@@ -322,36 +919,42 @@ class FaceStorage:
         """Get list of all known people with their face counts."""
         known_faces = []
         
-        for person_dir in self.known_path.iterdir():
-            if not person_dir.is_dir():
-                continue
-            
-            name = person_dir.name
-            image_count = len(list(person_dir.glob("*.jpg")))
-            
+        for entry in _scan_dirs(self.known_path):
             known_faces.append({
-                "name": name,
-                "image_count": image_count
+                "name": entry.name,
+                "image_count": len(_scan_files(Path(entry.path), ".jpg"))
             })
         
         return known_faces
     
     def get_unknown_face_image_path(self, face_id: str) -> Optional[Path]:
         """Get the image path for an unknown face."""
-        unknown_dir = self.unknown_path / face_id
+        unknown_dir = self._entry_dir(self.unknown_path, face_id)
+        if unknown_dir is None:
+            return None
         image_file = unknown_dir / "image.jpg"
+        self._wait_for_writes(unknown_dir)
         
         if image_file.exists():
             return image_file
         return None
     
     def get_unknown_face_face_path(self, face_id: str) -> Optional[Path]:
-        """Get the cropped face image path for an unknown face."""
-        unknown_dir = self.unknown_path / face_id
+        """Get the cropped face image path for an unknown face; for a face that was saved
+        already cropped, that is its only image."""
+        unknown_dir = self._entry_dir(self.unknown_path, face_id)
+        if unknown_dir is None:
+            return None
         face_file = unknown_dir / "face.jpg"
+        self._wait_for_writes(unknown_dir)
         
         if face_file.exists():
             return face_file
+        
+        rows = self._db_execute("SELECT has_face FROM unknown_faces WHERE id = ?", (face_id,))
+        image_file = unknown_dir / "image.jpg"
+        if rows and rows[0][0] and image_file.exists():
+            return image_file
         return None
     
     def get_known_face_images(self, name: str) -> List[dict]:
@@ -361,30 +964,59 @@ class FaceStorage:
             return []
         
         images = []
-        for image_file in person_dir.glob("*.jpg"):
+        for filename in _scan_files(person_dir, ".jpg"):
             images.append({
-                "filename": image_file.name,
-                "url": f"/api/known-faces/{name}/image/{image_file.name}"
+                "filename": filename,
+                "url": f"/api/known-faces/{name}/image/{filename}"
             })
         
         return sorted(images, key=lambda x: x["filename"], reverse=True)
     
+    def _event_image_lost(self, event_id: str):
+        """Drop a recognition event whose original image could not be written."""
+        logger.error(f"Removing recognition event whose original image was not saved: event_id={event_id}")
+        self._db_execute("DELETE FROM recognition_events WHERE id = ?", (event_id,))
+        shutil.rmtree(self.recognitions_path / event_id, ignore_errors=True)
+    
+    def _event_face_lost(self, event_id: str, face_index: int):
+        """Record in a recognition event that one face crop could not be written."""
+        logger.error(f"Recognition event face image was not saved: event_id={event_id}, face_index={face_index}")
+        with self._db_lock:
+            row = self.db.execute("SELECT faces_json FROM recognition_events WHERE id = ?", (event_id,)).fetchone()
+            if row is None:
+                return
+            faces = _json_loads(row[0])
+            for face in faces:
+                if face["face_index"] == face_index:
+                    face["face_image"] = None
+            self.db.execute("UPDATE recognition_events SET faces_json = ? WHERE id = ?", (_json_dumps(faces), event_id))
+    
+    def _queue_event_face(self, event_id: str, face_index: int, face_file: Path, face_image: np.ndarray):
+        """Encode one (already reserved) face crop of a recognition event and queue it."""
+        on_failure = partial(self._event_face_lost, event_id, face_index)
+        try:
+            face_image_data = _encode_jpeg(face_image)
+        except Exception as e:
+            logger.error(f"Failed to encode face image: path={face_file}, error={str(e)}")
+            on_failure()
+            self._release_write(face_file)
+            return
+        self._queue_write(face_file, face_image_data, reserved=True, on_failure=on_failure)
+    
     def save_recognition_event(self, image_data: bytes, processed_result: dict) -> str:
         """Save a recognition event with all detected faces."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        event_id = f"recognition_{timestamp}"
+        now = datetime.now()
+        event_id = f"recognition_{now.strftime('%Y%m%d_%H%M%S_%f')}"
         
         event_dir = self.recognitions_path / event_id
         event_dir.mkdir(exist_ok=True)
         
-        # Save original image
+        # Files are reserved before the event is indexed so readers wait for them, and
+        # queued after it, so a failed write can roll back the row
         original_file = event_dir / "original.jpg"
-        with open(original_file, "wb") as f:
-            f.write(image_data)
-        logger.info(f"Saved original image for recognition event: event_id={event_id}")
-        
-        # Save each detected face
+        self._reserve_write(original_file)
         faces_data = []
+        face_crops = []
         image = processed_result['image']
         
         for face_result in processed_result['faces']:
@@ -392,12 +1024,9 @@ class FaceStorage:
             top, right, bottom, left = face_result['location']
             
             # Extract face from image
-            face_image = image[top:bottom, left:right]
-            
-            # Convert to PIL and save
-            pil_image = Image.fromarray(face_image)
             face_file = event_dir / f"face_{face_index}.jpg"
-            pil_image.save(face_file, format='JPEG', quality=95)
+            self._reserve_write(face_file)
+            face_crops.append((face_index, face_file, image[top:bottom, left:right], face_result.get('encoding')))
             
             faces_data.append({
                 "face_index": face_index,
@@ -414,77 +1043,76 @@ class FaceStorage:
             })
         
         # Save metadata
-        metadata = {
-            "event_id": event_id,
-            "timestamp": datetime.now().isoformat(),
-            "total_faces": processed_result['total_faces'],
-            "faces": faces_data
-        }
+        try:
+            self._db_execute(
+                "INSERT INTO recognition_events (id, ts, total, faces_json) VALUES (?, ?, ?, ?)",
+                (event_id, now.isoformat(), processed_result['total_faces'], _json_dumps(faces_data))
+            )
+        except Exception:
+            self._release_write(original_file)
+            for _, face_file, _, _ in face_crops:
+                self._release_write(face_file)
+            raise
         
-        metadata_file = event_dir / "metadata.json"
-        with open(metadata_file, "w") as f:
-            json.dump(metadata, f, indent=2)
+        # Queue the original image; face crops are JPEG encoded concurrently and queued
+        # as they finish
+        self._queue_write(original_file, image_data, reserved=True, on_failure=partial(self._event_image_lost, event_id))
+        for face_index, face_file, face_image, encoding in face_crops:
+            self._io_executor.submit(self._queue_event_face, event_id, face_index, face_file, face_image)
+            # The encoding is only a shortcut: without it, adding the face re-encodes it
+            if encoding is not None:
+                self._queue_write(event_dir / f"face_{face_index}.npy", _npy_bytes(encoding))
         
         logger.info(f"Saved recognition event metadata: event_id={event_id}, faces={processed_result['total_faces']}")
         return event_id
     
-    def get_recognition_history(self) -> List[dict]:
-        """Get all recognition events."""
+    def _event_from_row(self, event_id: str, ts: str, total: int, faces_json: str) -> dict:
+        """Build the API shape of a recognition event from its database row."""
+        faces = _json_loads(faces_json)
+        for face in faces:
+            if face.get("face_image"):
+                face["face_image_url"] = f"/api/recognition-history/{event_id}/face/{face['face_index']}"
+        
+        return {
+            "event_id": event_id,
+            "timestamp": ts,
+            "total_faces": total,
+            "faces": faces,
+            "original_image_url": f"/api/recognition-history/{event_id}/original"
+        }
+    
+    def get_recognition_history(self, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """Get recognition events, newest first; limit and offset select one page, and
+        only that page's faces are parsed."""
         events = []
         
-        for event_dir in self.recognitions_path.iterdir():
-            if not event_dir.is_dir():
-                continue
-            
-            metadata_file = event_dir / "metadata.json"
-            if not metadata_file.exists():
-                continue
-            
+        rows = self._db_execute(
+            "SELECT id, ts, total, faces_json FROM recognition_events ORDER BY ts DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        )
+        for row in rows:
             try:
-                with open(metadata_file, "r") as f:
-                    metadata = json.load(f)
-                
-                # Add image URLs
-                metadata["original_image_url"] = f"/api/recognition-history/{metadata['event_id']}/original"
-                
-                # Add face image URLs
-                for face in metadata.get('faces', []):
-                    face["face_image_url"] = f"/api/recognition-history/{metadata['event_id']}/face/{face['face_index']}"
-                
-                events.append(metadata)
+                events.append(self._event_from_row(*row))
             except Exception as e:
-                logger.error(f"Error loading recognition event {event_dir.name}: {str(e)}")
+                logger.error(f"Error loading recognition event {row[0]}: {str(e)}")
                 continue
         
-        # Sort by timestamp (newest first)
-        events.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
         return events
     
     def get_recognition_event(self, event_id: str) -> Optional[dict]:
         """Get a specific recognition event."""
-        event_dir = self.recognitions_path / event_id
-        if not event_dir.exists():
+        rows = self._db_execute("SELECT id, ts, total, faces_json FROM recognition_events WHERE id = ?", (event_id,))
+        if not rows:
             return None
         
-        metadata_file = event_dir / "metadata.json"
-        if not metadata_file.exists():
-            return None
-        
-        with open(metadata_file, "r") as f:
-            metadata = json.load(f)
-        
-        # Add image URLs
-        metadata["original_image_url"] = f"/api/recognition-history/{event_id}/original"
-        for face in metadata.get('faces', []):
-            face["face_image_url"] = f"/api/recognition-history/{event_id}/face/{face['face_index']}"
-        
-        return metadata
+        return self._event_from_row(*rows[0])
     
     def get_recognition_image_path(self, event_id: str, image_type: str = "original", face_index: Optional[int] = None) -> Optional[Path]:
         """Get the path to a recognition event image."""
-        event_dir = self.recognitions_path / event_id
-        if not event_dir.exists():
+        event_dir = self._entry_dir(self.recognitions_path, event_id)
+        if event_dir is None or not event_dir.exists():
             return None
+        self._wait_for_writes(event_dir)
         
         if image_type == "original":
             image_file = event_dir / "original.jpg"
@@ -514,9 +1142,29 @@ class FaceStorage:
             logger.exception(f"Error reading face image data: event_id={event_id}, face_index={face_index}, error={str(e)}")
             return None
     
+    def get_recognition_face_encoding(self, event_id: str, face_index: int) -> Optional[np.ndarray]:
+        """Get the stored encoding of a face from a recognition event, if any."""
+        event_dir = self._entry_dir(self.recognitions_path, event_id)
+        if event_dir is None:
+            return None
+        encoding_file = event_dir / f"face_{face_index}.npy"
+        self._wait_for_writes(event_dir)
+        if not encoding_file.exists():
+            return None
+        
+        try:
+            return np.load(encoding_file)
+        except Exception as e:
+            logger.warning(f"Error reading face encoding: event_id={event_id}, face_index={face_index}, error={str(e)}")
+            return None
+    
     def delete_recognition_event(self, event_id: str) -> bool:
         """Delete a recognition event."""
-        event_dir = self.recognitions_path / event_id
+        event_dir = self._entry_dir(self.recognitions_path, event_id)
+        if event_dir is None:
+            return False
+        self._db_execute("DELETE FROM recognition_events WHERE id = ?", (event_id,))
+        self._wait_for_writes(event_dir)
         if event_dir.exists():
             shutil.rmtree(event_dir)
             logger.info(f"Deleted recognition event: event_id={event_id}")
@@ -528,24 +1176,45 @@ class FaceStorage:
         default_settings = {
             "webhook_url": "",
             "webhook_enabled": False,
-            "tolerance": 0.75
+            "tolerance": 0.75,
+            "detector_model": "hog",
+            "min_face_size": 40
         }
         
-        if not self.settings_path.exists():
+        try:
+            mtime_ns = self.settings_path.stat().st_mtime_ns
+        except FileNotFoundError:
             logger.info("Settings file not found, using defaults")
             return default_settings
         
+        # Only re-read the file when it changed; hand out copies so callers can modify them
+        cached = self._settings_cache
+        if cached is not None and cached[0] == mtime_ns:
+            return dict(cached[1])
+        
         try:
-            with open(self.settings_path, "r") as f:
-                settings = json.load(f)
+            settings = _json_loads(self.settings_path.read_bytes())
             
             # Ensure all required keys exist
             for key, default_value in default_settings.items():
                 if key not in settings:
                     settings[key] = default_value
             
+            # A hand-edited file may hold values the API would reject; fall back to the
+            # defaults for those instead of failing every recognition
+            valid = {
+                "tolerance": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool) and 0.0 <= v <= 1.0,
+                "detector_model": lambda v: v in ("hog", "cnn"),
+                "min_face_size": lambda v: isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 1000,
+            }
+            for key, is_valid in valid.items():
+                if not is_valid(settings[key]):
+                    logger.warning(f"Invalid setting ignored: {key}={settings[key]!r}, using default {default_settings[key]!r}")
+                    settings[key] = default_settings[key]
+            
+            self._settings_cache = (mtime_ns, settings)
             logger.info(f"Loaded settings from {self.settings_path}")
-            return settings
+            return dict(settings)
         except Exception as e:
             logger.exception(f"Error loading settings: {str(e)}")
             return default_settings
@@ -553,8 +1222,8 @@ class FaceStorage:
     def save_settings(self, settings: dict) -> bool:
         """Save settings to JSON file."""
         try:
-            with open(self.settings_path, "w") as f:
-                json.dump(settings, f, indent=2)
+            self.settings_path.write_text(_json_dumps(settings, indent=True))
+            self._settings_cache = None
             
             logger.info(f"Saved settings to {self.settings_path}")
             return True
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """A FaceStorage in a temporary directory, closed after the test."""
+    from app.storage import FaceStorage
+    
+    storage = FaceStorage(str(tmp_path / "faces"))
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
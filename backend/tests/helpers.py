@@ -0,0 +1,20 @@
+import numpy as np
+from io import BytesIO
+from PIL import Image
+
+
+def random_encoding(rng) -> np.ndarray:
+    """A made up 128-d encoding; two of them are about 1.6 apart, well beyond any tolerance."""
+    return rng.normal(0.0, 0.1, 128).astype(np.float32)
+
+
+def encoding_near(encoding: np.ndarray, distance: float, rng) -> np.ndarray:
+    """An encoding exactly distance away from encoding, in a random direction."""
+    direction = rng.normal(size=128)
+    return (encoding + distance * direction / np.linalg.norm(direction)).astype(np.float32)
+
+
+def jpeg_bytes(width: int = 120, height: int = 90, color=(120, 90, 60)) -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (width, height), color).save(output, format="JPEG")
+    return output.getvalue()
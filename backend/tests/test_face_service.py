@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from app import recognition_kernels
+from app.face_service import FaceRecognitionService
+from helpers import encoding_near, jpeg_bytes, random_encoding
+
+
+def add_person(storage, name, encodings):
+    for encoding in encodings:
+        assert storage.save_known_face(name, jpeg_bytes(), encoding=encoding)
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def brute_force(request, monkeypatch):
+    """Run a test once with the numba kernel and once with the numpy matmul."""
+    if request.param == "numba":
+        pytest.importorskip("numba")
+    else:
+        monkeypatch.setattr(recognition_kernels, "closest_rows", lambda matrix, probes: None)
+    return request.param
+
+
+def test_match_encodings_finds_closest_person(storage, rng, brute_force):
+    alice = [random_encoding(rng) for _ in range(3)]
+    bob = [random_encoding(rng) for _ in range(2)]
+    add_person(storage, "alice", alice)
+    add_person(storage, "bob", bob)
+    service = FaceRecognitionService(storage)
+    
+    probes = np.stack([encoding_near(bob[1], 0.2, rng), encoding_near(alice[2], 0.3, rng)])
+    best_groups, best_d2, group_names = service._match_encodings(probes)
+    
+    assert [group_names[g] for g in best_groups] == ["bob", "alice"]
+    expected = [
+        min(np.linalg.norm(probes[0] - e) for e in bob),
+        min(np.linalg.norm(probes[1] - e) for e in alice),
+    ]
+    np.testing.assert_allclose(np.sqrt(best_d2), expected, atol=1e-4)
+
+
+def test_match_encodings_without_known_faces(storage, rng):
+    service = FaceRecognitionService(storage)
+    
+    best_groups, best_d2, group_names = service._match_encodings(np.stack([random_encoding(rng)]))
+    
+    assert group_names == []
+    assert len(best_groups) == 0 and len(best_d2) == 0
+
+
+def test_match_encodings_sees_faces_added_after_invalidate(storage, rng):
+    alice = random_encoding(rng)
+    add_person(storage, "alice", [alice])
+    service = FaceRecognitionService(storage)
+    service._match_encodings(np.stack([alice]))
+    
+    carol = random_encoding(rng)
+    add_person(storage, "carol", [carol])
+    service.invalidate_cache()
+    best_groups, best_d2, group_names = service._match_encodings(np.stack([carol]))
+    
+    assert group_names[best_groups[0]] == "carol"
+    assert best_d2[0] == pytest.approx(0.0, abs=1e-4)
+
+
+def test_recent_person_within_early_exit_skips_everyone_else(storage, rng):
+    alice = random_encoding(rng)
+    probe = encoding_near(alice, 0.2, rng)
+    add_person(storage, "alice", [alice])
+    add_person(storage, "carol", [encoding_near(probe, 0.1, rng)])
+    service = FaceRecognitionService(storage)
+    
+    best_groups, _, group_names = service._match_encodings(np.stack([probe]))
+    assert group_names[best_groups[0]] == "carol"
+    
+    # carol is closer, but alice was seen recently and is within the early exit distance
+    service._mark_recent(["alice"])
+    best_groups, best_d2, group_names = service._match_encodings(np.stack([probe]))
+    
+    assert group_names[best_groups[0]] == "alice"
+    assert np.sqrt(best_d2[0]) == pytest.approx(0.2, abs=1e-4)
+
+
+def test_recent_person_beyond_early_exit_is_compared_with_everyone(storage, rng):
+    alice = random_encoding(rng)
+    probe = encoding_near(alice, 0.5, rng)
+    add_person(storage, "alice", [alice])
+    add_person(storage, "carol", [encoding_near(probe, 0.4, rng)])
+    service = FaceRecognitionService(storage)
+    service._mark_recent(["alice"])
+    
+    best_groups, best_d2, group_names = service._match_encodings(np.stack([probe]))
+    
+    assert group_names[best_groups[0]] == "carol"
+    assert np.sqrt(best_d2[0]) == pytest.approx(0.4, abs=1e-4)
+
+
+def test_recent_names_are_most_recent_first_and_bounded(storage):
+    service = FaceRecognitionService(storage)
+    names = [f"person{i}" for i in range(service.RECENT_NAMES_SIZE + 2)]
+    
+    for name in names:
+        service._mark_recent([name])
+    service._mark_recent([names[3]])
+    
+    recent = list(service._recent_names)
+    assert len(recent) == service.RECENT_NAMES_SIZE
+    assert recent[0] == names[3]
+    assert recent[1] == names[-1]
+    assert names[0] not in recent and names[1] not in recent
+
+
+def test_match_encodings_across_kernel_blocks(storage, rng, brute_force):
+    # More rows than one kernel block, with the closest ones in different blocks
+    encodings = [random_encoding(rng) for _ in range(recognition_kernels.BLOCK_ROWS + 300)]
+    assert all(storage.save_known_faces_bulk("crowd", [jpeg_bytes()] * len(encodings), encodings))
+    add_person(storage, "alice", [random_encoding(rng)])
+    service = FaceRecognitionService(storage)
+    
+    probes = np.stack([encoding_near(encodings[5], 0.1, rng), encoding_near(encodings[-5], 0.2, rng)])
+    best_groups, best_d2, group_names = service._match_encodings(probes)
+    
+    assert [group_names[g] for g in best_groups] == ["crowd", "crowd"]
+    np.testing.assert_allclose(np.sqrt(best_d2), [0.1, 0.2], atol=1e-4)
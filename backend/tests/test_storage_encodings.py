@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from app.storage import (
+    ENCODINGS_FILE,
+    ENCODINGS_HEADER_BYTES,
+    ENCODINGS_INDEX_FILE,
+    ENCODING_ROW_BYTES,
+    FaceStorage,
+)
+from helpers import jpeg_bytes, random_encoding
+
+
+def test_saved_encodings_round_trip(storage, rng):
+    encodings = [random_encoding(rng) for _ in range(3)]
+    for encoding in encodings:
+        assert storage.save_known_face("alice", jpeg_bytes(), encoding=encoding)
+    
+    np.testing.assert_array_equal(storage.load_person_encodings("alice"), np.stack(encodings))
+    np.testing.assert_array_equal(storage.load_known_encodings()["alice"], np.stack(encodings))
+    
+    person_dir = storage.known_path / "alice"
+    stems = json.loads((person_dir / ENCODINGS_INDEX_FILE).read_text())
+    assert len(set(stems)) == 3
+    assert sorted(f"{stem}.jpg" for stem in stems) == sorted(image["filename"] for image in storage.get_known_face_images("alice"))
+
+
+def test_append_grows_the_preallocated_log(storage, rng):
+    encodings = [random_encoding(rng) for _ in range(20)]
+    saved = storage.save_known_faces_bulk("alice", [jpeg_bytes()] * 20, encodings)
+    assert all(saved)
+    
+    encodings_file = storage.known_path / "alice" / ENCODINGS_FILE
+    with open(encodings_file, "rb") as f:
+        assert int.from_bytes(f.read(ENCODINGS_HEADER_BYTES), "little") == 20
+    # Capacity doubles from 16 rows
+    assert encodings_file.stat().st_size == ENCODINGS_HEADER_BYTES + 32 * ENCODING_ROW_BYTES
+    np.testing.assert_array_equal(storage.load_person_encodings("alice"), np.stack(encodings))
+
+
+def test_delete_known_face_image_removes_its_encoding(storage, rng):
+    encodings = [random_encoding(rng) for _ in range(3)]
+    for encoding in encodings:
+        assert storage.save_known_face("alice", jpeg_bytes(), encoding=encoding)
+    stems = json.loads((storage.known_path / "alice" / ENCODINGS_INDEX_FILE).read_text())
+    
+    assert storage.delete_known_face_image("alice", f"{stems[1]}.jpg")
+    
+    np.testing.assert_array_equal(storage.load_person_encodings("alice"), np.stack([encodings[0], encodings[2]]))
+    assert len(storage.get_known_face_images("alice")) == 2
+
+
+def test_delete_known_face_drops_the_person(storage, rng):
+    assert storage.save_known_face("alice", jpeg_bytes(), encoding=random_encoding(rng))
+    assert storage.save_known_face("bob", jpeg_bytes(), encoding=random_encoding(rng))
+    assert set(storage.load_known_encodings()) == {"alice", "bob"}
+    
+    assert storage.delete_known_face("alice")
+    
+    assert set(storage.load_known_encodings()) == {"bob"}
+
+
+def test_migrates_per_face_npy_files(tmp_path, rng):
+    person_dir = tmp_path / "faces" / "known" / "alice"
+    person_dir.mkdir(parents=True)
+    encodings = {}
+    for stem in ("20240101_000000", "20240102_000000"):
+        encodings[stem] = random_encoding(rng)
+        np.save(person_dir / f"{stem}.npy", encodings[stem])
+        (person_dir / f"{stem}.jpg").write_bytes(jpeg_bytes())
+    
+    storage = FaceStorage(str(tmp_path / "faces"))
+    try:
+        np.testing.assert_array_equal(storage.load_person_encodings("alice"), np.stack(list(encodings.values())))
+        assert json.loads((person_dir / ENCODINGS_INDEX_FILE).read_text()) == list(encodings)
+        assert not list(person_dir.glob("*.npy"))
+    finally:
+        storage.close()
+
+
+def test_small_bulk_saves_do_not_start_the_encoder_pool(storage):
+    images = [jpeg_bytes(color=(40 * i, 0, 0)) for i in range(3)]
+    
+    assert all(storage.save_known_faces_bulk("alice", images))
+    
+    assert storage._encode_pool is None
+    assert len(storage.load_person_encodings("alice")) == 3
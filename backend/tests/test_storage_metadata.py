@@ -0,0 +1,230 @@
+import builtins
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from app import storage as storage_module
+from app.storage import FaceStorage
+from helpers import jpeg_bytes, random_encoding
+
+
+def recognition_result(rng, faces: int = 1) -> dict:
+    """A processed recognition result as FaceRecognitionService hands it to storage."""
+    return {
+        "image": np.zeros((90, 120, 3), dtype=np.uint8),
+        "total_faces": faces,
+        "faces": [
+            {
+                "face_index": i,
+                "known_person": False,
+                "name_person": "",
+                "distance": None,
+                "location": (10, 40 + 30 * i, 40, 10 + 30 * i),
+                "encoding": random_encoding(rng),
+            }
+            for i in range(faces)
+        ],
+    }
+
+
+def fail_writes_to(monkeypatch, *names):
+    """Make the writer thread fail to write files with the given names."""
+    def failing_open(path, mode="r", *args, **kwargs):
+        if "w" in mode and getattr(path, "name", None) in names:
+            raise OSError("No space left on device")
+        return builtins.open(path, mode, *args, **kwargs)
+    
+    monkeypatch.setattr(storage_module, "open", failing_open, raising=False)
+
+
+def test_unknown_face_round_trip(storage, rng):
+    encoding = random_encoding(rng)
+    face_id = storage.save_unknown_face(jpeg_bytes(), encoding=encoding, face_location=(10, 60, 60, 10))
+    
+    faces = storage.get_unknown_faces()
+    assert [face["id"] for face in faces] == [face_id]
+    assert faces[0]["has_face_image"] and faces[0]["face_url"] == f"/api/unknown-faces/{face_id}/face"
+    assert storage.get_unknown_face_image_path(face_id).read_bytes() == jpeg_bytes()
+    assert storage.get_unknown_face_face_path(face_id) is not None
+    
+    assert storage.delete_unknown_face(face_id)
+    assert storage.get_unknown_faces() == []
+    assert storage.get_unknown_face_image_path(face_id) is None
+
+
+def test_recognition_event_round_trip(storage, rng):
+    result = recognition_result(rng, faces=2)
+    event_id = storage.save_recognition_event(jpeg_bytes(), result)
+    
+    event = storage.get_recognition_event(event_id)
+    assert event["total_faces"] == 2
+    assert [face["location"] for face in event["faces"]] == [
+        {"top": 10, "right": 40, "bottom": 40, "left": 10},
+        {"top": 10, "right": 70, "bottom": 40, "left": 40},
+    ]
+    assert event["faces"][1]["face_image_url"] == f"/api/recognition-history/{event_id}/face/1"
+    assert storage.get_recognition_image_path(event_id, "original").read_bytes() == jpeg_bytes()
+    assert storage.get_recognition_face_image_data(event_id, 1)
+    np.testing.assert_array_equal(storage.get_recognition_face_encoding(event_id, 1), result["faces"][1]["encoding"])
+    
+    assert storage.delete_recognition_event(event_id)
+    assert storage.get_recognition_event(event_id) is None
+    assert storage.get_recognition_history() == []
+
+
+def test_metadata_survives_reopening(tmp_path, rng):
+    storage = FaceStorage(str(tmp_path / "faces"))
+    face_id = storage.save_unknown_face(jpeg_bytes(), face_location=(10, 60, 60, 10))
+    event_id = storage.save_recognition_event(jpeg_bytes(), recognition_result(rng))
+    storage.close()
+    
+    storage = FaceStorage(str(tmp_path / "faces"))
+    try:
+        assert [face["id"] for face in storage.get_unknown_faces()] == [face_id]
+        assert [event["event_id"] for event in storage.get_recognition_history()] == [event_id]
+    finally:
+        storage.close()
+
+
+def test_migrates_metadata_json_files(tmp_path):
+    base_path = tmp_path / "faces"
+    unknown_dir = base_path / "unknown" / "unknown_20240101_000000_000000"
+    unknown_dir.mkdir(parents=True)
+    (unknown_dir / "image.jpg").write_bytes(jpeg_bytes())
+    (unknown_dir / "metadata.json").write_text(json.dumps({
+        "id": unknown_dir.name,
+        "timestamp": "2024-01-01T00:00:00",
+        "image_path": f"unknown/{unknown_dir.name}/image.jpg",
+        "has_face_image": False,
+    }))
+    event_dir = base_path / "recognitions" / "recognition_20240101_000000_000000"
+    event_dir.mkdir(parents=True)
+    faces = [{"face_index": 0, "known_person": True, "name_person": "alice", "distance": 0.3,
+              "location": {"top": 1, "right": 2, "bottom": 3, "left": 0}, "face_image": "face_0.jpg"}]
+    (event_dir / "metadata.json").write_text(json.dumps({
+        "event_id": event_dir.name,
+        "timestamp": "2024-01-01T00:00:01",
+        "total_faces": 1,
+        "faces": faces,
+    }))
+    # An unreadable file is skipped rather than failing the migration
+    broken_dir = base_path / "unknown" / "unknown_broken"
+    broken_dir.mkdir()
+    (broken_dir / "metadata.json").write_text("{")
+    
+    storage = FaceStorage(str(base_path))
+    try:
+        unknown = storage.get_unknown_faces()
+        assert [(face["id"], face["timestamp"], face["has_face_image"]) for face in unknown] == [
+            (unknown_dir.name, "2024-01-01T00:00:00", False)
+        ]
+        event = storage.get_recognition_event(event_dir.name)
+        assert event["timestamp"] == "2024-01-01T00:00:01"
+        assert event["faces"][0]["name_person"] == "alice"
+    finally:
+        storage.close()
+    
+    # The import runs once; metadata.json files written afterwards are not picked up
+    late_dir = base_path / "unknown" / "unknown_20240102_000000_000000"
+    late_dir.mkdir()
+    (late_dir / "metadata.json").write_text(json.dumps({"id": late_dir.name, "timestamp": "2024-01-02T00:00:00"}))
+    storage = FaceStorage(str(base_path))
+    try:
+        assert [face["id"] for face in storage.get_unknown_faces()] == [unknown_dir.name]
+    finally:
+        storage.close()
+
+
+def test_unknown_faces_page_newest_first(storage):
+    face_ids = [storage.save_unknown_face(jpeg_bytes(), face_location=(10, 60, 60, 10)) for _ in range(5)]
+    newest_first = face_ids[::-1]
+    
+    assert [face["id"] for face in storage.get_unknown_faces()] == newest_first
+    assert [face["id"] for face in storage.get_unknown_faces(limit=2)] == newest_first[:2]
+    assert [face["id"] for face in storage.get_unknown_faces(limit=2, offset=2)] == newest_first[2:4]
+    assert [face["id"] for face in storage.get_unknown_faces(offset=4)] == newest_first[4:]
+    assert storage.get_unknown_faces(limit=2, offset=5) == []
+
+
+def test_recognition_history_pages_newest_first(storage, rng):
+    event_ids = [storage.save_recognition_event(jpeg_bytes(), recognition_result(rng)) for _ in range(5)]
+    newest_first = event_ids[::-1]
+    
+    assert [event["event_id"] for event in storage.get_recognition_history()] == newest_first
+    assert [event["event_id"] for event in storage.get_recognition_history(limit=3)] == newest_first[:3]
+    assert [event["event_id"] for event in storage.get_recognition_history(limit=3, offset=3)] == newest_first[3:]
+    assert storage.get_recognition_history(limit=1, offset=5) == []
+
+
+def test_unknown_face_is_removed_when_its_image_is_not_written(storage, monkeypatch):
+    fail_writes_to(monkeypatch, "image.jpg")
+    
+    face_id = storage.save_unknown_face(jpeg_bytes(), face_location=(10, 60, 60, 10))
+    
+    assert storage.get_unknown_face_image_path(face_id) is None
+    assert storage.get_unknown_faces() == []
+    assert not (storage.unknown_path / face_id).exists()
+
+
+def test_unknown_face_without_crop_when_it_is_not_written(storage, monkeypatch):
+    fail_writes_to(monkeypatch, "face.jpg")
+    
+    face_id = storage.save_unknown_face(jpeg_bytes(), face_location=(10, 60, 60, 10))
+    
+    assert storage.get_unknown_face_face_path(face_id) is None
+    faces = storage.get_unknown_faces()
+    assert [face["id"] for face in faces] == [face_id]
+    assert not faces[0]["has_face_image"] and "face_url" not in faces[0]
+
+
+def test_recognition_event_is_removed_when_its_image_is_not_written(storage, rng, monkeypatch):
+    fail_writes_to(monkeypatch, "original.jpg")
+    
+    event_id = storage.save_recognition_event(jpeg_bytes(), recognition_result(rng))
+    
+    assert storage.get_recognition_image_path(event_id, "original") is None
+    assert storage.get_recognition_event(event_id) is None
+
+
+def test_recognition_event_face_is_marked_when_its_crop_is_not_written(storage, rng, monkeypatch):
+    fail_writes_to(monkeypatch, "face_0.jpg")
+    
+    event_id = storage.save_recognition_event(jpeg_bytes(), recognition_result(rng, faces=2))
+    
+    assert storage.get_recognition_image_path(event_id, "face", 0) is None
+    faces = storage.get_recognition_event(event_id)["faces"]
+    assert faces[0]["face_image"] is None and "face_image_url" not in faces[0]
+    assert faces[1]["face_image_url"] == f"/api/recognition-history/{event_id}/face/1"
+
+
+@pytest.mark.parametrize("face_id", ["..", "../../precious", "..\\precious", "a/b", ""])
+def test_traversal_ids_are_rejected(storage, face_id):
+    precious = storage.base_path.parent / "precious"
+    precious.mkdir()
+    (precious / "image.jpg").write_bytes(jpeg_bytes())
+    
+    assert storage.name_unknown_faces([face_id], "eve") == []
+    assert not storage.name_unknown_face(face_id, "eve")
+    assert not storage.delete_unknown_face(face_id)
+    assert storage.get_unknown_face_image_path(face_id) is None
+    assert not storage.delete_recognition_event(face_id)
+    assert storage.get_recognition_image_path(face_id) is None
+    
+    assert (precious / "image.jpg").exists()
+    assert storage.unknown_path.exists() and storage.recognitions_path.exists()
+    assert storage.get_known_faces() == []
+
+
+def test_pre_cropped_unknown_face_is_stored_once(storage):
+    face_image = jpeg_bytes(60, 80)
+    
+    face_id = storage.save_unknown_face(face_image, face_location=(0, 60, 80, 0))
+    
+    image_path = storage.get_unknown_face_image_path(face_id)
+    assert image_path.read_bytes() == face_image
+    assert storage.get_unknown_face_face_path(face_id) == image_path
+    assert not (storage.unknown_path / face_id / "face.jpg").exists()
+    assert storage.get_unknown_faces()[0]["face_url"] == f"/api/unknown-faces/{face_id}/face"
@@ -5,6 +5,8 @@ const Settings = () => {
   const [webhookUrl, setWebhookUrl] = useState('');
   const [webhookEnabled, setWebhookEnabled] = useState(false);
   const [tolerance, setTolerance] = useState(0.75);
+  const [detectorModel, setDetectorModel] = useState('hog');
+  const [minFaceSize, setMinFaceSize] = useState(40);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [error, setError] = useState(null);
@@ -22,6 +24,8 @@ const Settings = () => {
       setWebhookUrl(settings.webhook_url || '');
       setWebhookEnabled(settings.webhook_enabled || false);
       setTolerance(settings.tolerance !== undefined ? settings.tolerance : 0.75);
+      setDetectorModel(settings.detector_model || 'hog');
+      setMinFaceSize(settings.min_face_size !== undefined ? settings.min_face_size : 40);
     } catch (err) {
       setError(`Failed to load settings: ${err.message}`);
     } finally {
@@ -56,7 +60,9 @@ const Settings = () => {
       await updateSettings({
         webhook_url: webhookUrl.trim(),
         webhook_enabled: webhookEnabled,
-        tolerance: tolerance
+        tolerance: tolerance,
+        detector_model: detectorModel,
+        min_face_size: minFaceSize
       });
       
       setSuccess('Settings saved successfully!');
@@ -174,6 +180,65 @@ const Settings = () => {
           </p>
         </div>
 
+        <div style={{ marginBottom: '20px' }}>
+          <label htmlFor="detector-model" style={{ display: 'block', marginBottom: '8px', fontWeight: 'bold' }}>
+            Face Detector
+          </label>
+          <select
+            id="detector-model"
+            value={detectorModel}
+            onChange={(e) => setDetectorModel(e.target.value)}
+            disabled={saving}
+            style={{
+              padding: '8px',
+              fontSize: '14px',
+              border: '1px solid #ddd',
+              borderRadius: '4px'
+            }}
+          >
+            <option value="hog">HOG (fast)</option>
+            <option value="cnn">CNN (accurate, slow)</option>
+          </select>
+          <p style={{ fontSize: '0.85em', color: '#666', marginTop: '5px' }}>
+            <strong>HOG</strong> = Fast on CPU, falls back to CNN when no face is found<br />
+            <strong>CNN</strong> = Better with small, angled or poorly lit faces, but 20-50x slower without a GPU<br />
+            <strong>Default: HOG</strong>
+          </p>
+        </div>
+
+        <div style={{ marginBottom: '20px' }}>
+          <label htmlFor="min-face-size" style={{ display: 'block', marginBottom: '8px', fontWeight: 'bold' }}>
+            Minimum Face Size (pixels)
+          </label>
+          <input
+            id="min-face-size"
+            type="number"
+            min="0"
+            max="1000"
+            step="1"
+            value={minFaceSize}
+            onChange={(e) => {
+              const val = parseInt(e.target.value, 10);
+              if (!isNaN(val) && val >= 0 && val <= 1000) {
+                setMinFaceSize(val);
+              }
+            }}
+            disabled={saving}
+            style={{
+              width: '80px',
+              padding: '8px',
+              fontSize: '14px',
+              border: '1px solid #ddd',
+              borderRadius: '4px',
+              textAlign: 'center'
+            }}
+          />
+          <p style={{ fontSize: '0.85em', color: '#666', marginTop: '5px' }}>
+            Detected faces narrower or shorter than this are ignored, as they are too small to recognize reliably.<br />
+            <strong>Default: 40</strong>
+          </p>
+        </div>
+
         <button
           type="submit"
           className="button"